@@ -0,0 +1,189 @@
+"""Measures reset/step throughput, step latency and allocations of the CO2 ventilation environments.
+
+Usage:
+    python -m benchmarks.bench_envs --output bench_envs.json
+    python -m benchmarks.bench_envs --envs CO2VentilationSimulator-v0 VectorSimulator --steps 20000
+
+The production environment runs against local stand-ins for Service Bus and the
+fan speed REST service, so no credentials or network access are needed.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import gym
+import gym_co2_ventilation  # This will register the custom environments
+from gym_co2_ventilation.stand_ins import StandInFanServer, StandInServiceBus
+
+def _make_gym_env(env_id):
+    def factory(args):
+        return gym.make(env_id), 1, None, None
+    return factory
+
+def _make_replay_env(args):
+    from gym_co2_ventilation.envs.co2_ventilation_simulator_env import CO2VentilationSimulatorEnv
+    from gym_co2_ventilation.envs.sensor_trace import SensorTraceWriter
+
+    # Record a trace from the simulator to replay
+    trace_dir = tempfile.mkdtemp(prefix='co2_ventilation_trace_')
+    simulator = CO2VentilationSimulatorEnv()
+    simulator.reset()
+    writer = SensorTraceWriter(trace_dir)
+    rng = np.random.RandomState(0)
+    for i in range(10000):
+        action = int(rng.randint(4))
+        observation, reward, done, info = simulator.step(action)
+        writer.append(time.time(), observation[1], action)
+    writer.close()
+
+    os.environ["CO2_VENTILATION_TRACE_PATH"] = trace_dir
+    return gym.make('CO2VentilationReplay-v0'), 1, None, None
+
+def _make_vector_simulator(args):
+    from gym_co2_ventilation.envs import VectorCO2VentilationSimulatorEnv
+    return VectorCO2VentilationSimulatorEnv(num_envs=args.num_envs), args.num_envs, None, None
+
+def _make_subproc_simulator(args):
+    from gym_co2_ventilation.envs.subproc_vector_env import SubprocVectorEnv
+    env = SubprocVectorEnv('CO2VentilationSimulator-v0', args.num_envs, num_workers=args.num_workers)
+    return env, args.num_envs, None, env.close
+
+def _make_production_env(args):
+    from gym_co2_ventilation.envs.co2_ventilation_production_env import CO2VentilationProductionEnv, CO2_SENSOR_ID
+
+    fan_server = StandInFanServer()
+    bus = StandInServiceBus()
+    for name in ["SERVICE_BUS_NAMESPACE", "SERVICE_BUS_SAS_KEY_NAME", "SERVICE_BUS_SAS_KEY_VALUE", "VENTILATION_REST_API_KEY"]:
+        os.environ.setdefault(name, "stand-in")
+    os.environ["VENTILATION_REST_URL"] = fan_server.url
+    env = CO2VentilationProductionEnv(bus_service=bus)
+
+    # One sensor message arrives per step, and one before the first reset, which waits for a sample
+    rng = np.random.RandomState(0)
+    bus.publish(CO2_SENSOR_ID, int(rng.randint(400, 1500)))
+    def before_step():
+        bus.publish(CO2_SENSOR_ID, int(rng.randint(400, 1500)))
+
+    def cleanup():
+        env.close()
+        fan_server.close()
+
+    return env, 1, before_step, cleanup
+
+BENCHMARKS = {
+    'CO2VentilationSimple-v0': _make_gym_env('CO2VentilationSimple-v0'),
+    'CO2VentilationSimulator-v0': _make_gym_env('CO2VentilationSimulator-v0'),
+    'CO2VentilationReplay-v0': _make_replay_env,
+    'CO2VentilationProduction-v0': _make_production_env,
+    'VectorSimulator': _make_vector_simulator,
+    'SubprocSimulator': _make_subproc_simulator,
+}
+
+def _sample_actions(num_envs, nb_steps, rng):
+    if num_envs == 1:
+        return [int(a) for a in rng.randint(4, size=nb_steps)]
+    return list(rng.randint(4, size=(nb_steps, num_envs)))
+
+def _step(env, action, num_envs):
+    observation, reward, done, info = env.step(action)
+    # Vectorized environments reset themselves
+    if num_envs == 1 and done:
+        env.reset()
+
+def run_benchmark(name, args):
+    env, num_envs, before_step, cleanup = BENCHMARKS[name](args)
+    nb_steps = args.production_steps if name == 'CO2VentilationProduction-v0' else args.steps
+    rng = np.random.RandomState(0)
+    try:
+        start = time.perf_counter()
+        for i in range(args.resets):
+            env.reset()
+        reset_time = time.perf_counter() - start
+
+        # Step latency
+        actions = _sample_actions(num_envs, nb_steps, rng)
+        latencies = np.empty(nb_steps)
+        env.reset()
+        for i, action in enumerate(actions):
+            if before_step is not None:
+                before_step()
+            start = time.perf_counter()
+            _step(env, action, num_envs)
+            latencies[i] = time.perf_counter() - start
+
+        # Allocations, measured in a separate run because tracing slows down every allocation
+        nb_alloc_steps = min(nb_steps, args.allocation_steps)
+        actions = _sample_actions(num_envs, nb_alloc_steps, rng)
+        tracemalloc.start()
+        allocated_blocks = sys.getallocatedblocks()
+        peak_bytes = 0
+        for action in actions:
+            if before_step is not None:
+                before_step()
+            tracemalloc.reset_peak()
+            current, peak = tracemalloc.get_traced_memory()
+            _step(env, action, num_envs)
+            peak_bytes += tracemalloc.get_traced_memory()[1] - current
+        allocated_blocks = sys.getallocatedblocks() - allocated_blocks
+        tracemalloc.stop()
+    finally:
+        if cleanup is not None:
+            cleanup()
+
+    percentiles = np.percentile(latencies, [50, 90, 99]) * 1e6
+    return {
+        'env': name,
+        'num_envs': num_envs,
+        'steps': nb_steps,
+        'resets_per_sec': args.resets * num_envs / reset_time,
+        'steps_per_sec': nb_steps * num_envs / latencies.sum(),
+        'step_latency_us': {
+            'mean': latencies.mean() * 1e6,
+            'p50': percentiles[0],
+            'p90': percentiles[1],
+            'p99': percentiles[2],
+            'max': latencies.max() * 1e6,
+        },
+        'peak_traced_bytes_per_step': peak_bytes / nb_alloc_steps,
+        'net_allocated_blocks_per_step': allocated_blocks / nb_alloc_steps,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--envs', nargs='+', default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    parser.add_argument('--steps', type=int, default=10000)
+    parser.add_argument('--production-steps', type=int, default=1000)
+    parser.add_argument('--resets', type=int, default=1000)
+    parser.add_argument('--allocation-steps', type=int, default=1000)
+    parser.add_argument('--num-envs', type=int, default=64, help='Number of environments in the vectorized benchmarks')
+    parser.add_argument('--num-workers', type=int, default=None, help='Worker processes for SubprocSimulator')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.envs:
+        result = run_benchmark(name, args)
+        results.append(result)
+        print(f"{name:30s} {result['steps_per_sec']:14,.0f} steps/s  p50={result['step_latency_us']['p50']:9.1f} us  "
+              f"p99={result['step_latency_us']['p99']:9.1f} us  {result['peak_traced_bytes_per_step']:8.0f} B/step")
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'gym': gym.__version__,
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+if __name__ == '__main__':
+    main()
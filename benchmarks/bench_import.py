@@ -0,0 +1,101 @@
+"""Measures the cold start of a process that creates one of the environments, and fails if it regresses.
+
+Usage:
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --output bench_import.json
+    python -m benchmarks.bench_import --baseline bench_import.json --tolerance 0.25
+
+Every run is a fresh interpreter that imports gym and gym_co2_ventilation, makes the
+environment and resets it. Exits with status 1 if a simulator-only process imported
+one of the heavy dependencies (Azure, HTTP, Keras/TensorFlow), or if the median
+time spent after importing gym is more than tolerance (plus slack) slower than in
+the baseline.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+FORBIDDEN_MODULES = ['azure', 'requests', 'urllib3', 'h5py', 'keras', 'rl', 'tensorflow']
+
+CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import gym
+gym_seconds = time.perf_counter() - start
+import gym_co2_ventilation
+env = gym.make({env_id!r})
+env.reset()
+seconds = time.perf_counter() - start
+forbidden = sorted(name for name in sys.modules if name.split('.')[0] in {forbidden!r})
+print(json.dumps({{'seconds': seconds, 'gym_seconds': gym_seconds, 'forbidden_modules': forbidden}}))
+"""
+
+def measure_cold_start(env_id, runs):
+    code = CHILD_CODE.format(env_id=env_id, forbidden=FORBIDDEN_MODULES)
+    samples = []
+    for i in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    package_seconds = np.array([s['seconds'] - s['gym_seconds'] for s in samples])
+    return {
+        'env': env_id,
+        'runs': runs,
+        'median_seconds': float(np.median([s['seconds'] for s in samples])),
+        'median_gym_seconds': float(np.median([s['gym_seconds'] for s in samples])),
+        'median_package_seconds': float(np.median(package_seconds)),
+        'forbidden_modules': sorted({name for s in samples for name in s['forbidden_modules']}),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--envs', nargs='+', default=['CO2VentilationSimulator-v0', 'CO2VentilationSimple-v0', 'CO2VentilationVectorSimulator-v0'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--baseline', default=None, help='Results of a previous run (--output) to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown relative to the baseline')
+    parser.add_argument('--slack', type=float, default=0.005, help='Allowed slowdown in seconds on top of the tolerance, absorbs noise')
+    parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = {result['env']: result for result in json.load(f)['results']}
+
+    results = []
+    failures = []
+    for env_id in args.envs:
+        result = measure_cold_start(env_id, args.runs)
+        results.append(result)
+        print(f"{env_id:35s} {result['median_seconds'] * 1e3:8.1f} ms total  "
+              f"{result['median_package_seconds'] * 1e3:8.1f} ms after importing gym")
+        if result['forbidden_modules']:
+            failures.append(f"{env_id} imported {', '.join(result['forbidden_modules'])}")
+        if env_id in baseline:
+            limit = baseline[env_id]['median_package_seconds'] * (1 + args.tolerance) + args.slack
+            if result['median_package_seconds'] > limit:
+                failures.append(f"{env_id} cold start took {result['median_package_seconds'] * 1e3:.1f} ms, "
+                                f"baseline {baseline[env_id]['median_package_seconds'] * 1e3:.1f} ms")
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Load-tests CO2VentilationProductionEnv against local stand-ins with injected faults.
+
+Usage:
+    python -m benchmarks.load_production_env --publish-interval 0.001 --steps 2000
+    python -m benchmarks.load_production_env --fan-latency 0.05 --fan-error-rate 0.1 --bus-timeout-rate 0.05
+
+Sensor messages are published by the stand-in Service Bus at a fixed rate, and the
+fan speed commands go to a stand-in REST endpoint on localhost. Reports the step
+latency together with the counters of the fan client, the sensor data consumer
+and the stand-ins.
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from gym_co2_ventilation.envs.co2_ventilation_production_env import CO2VentilationProductionEnv, CO2_SENSOR_ID
+from gym_co2_ventilation.metrics import MetricsRegistry
+from gym_co2_ventilation.stand_ins import StandInFanServer, StandInServiceBus
+
+def run_load_test(args):
+    fan_server = StandInFanServer(latency=args.fan_latency, error_rate=args.fan_error_rate,
+                                  timeout_rate=args.fan_timeout_rate, drop_rate=args.fan_drop_rate,
+                                  hang_time=args.fan_hang_time, seed=args.seed)
+    bus = StandInServiceBus(sensor_ids=[CO2_SENSOR_ID], receive_latency=args.bus_latency,
+                            timeout_rate=args.bus_timeout_rate, drop_rate=args.bus_drop_rate, seed=args.seed)
+    for name in ["SERVICE_BUS_NAMESPACE", "SERVICE_BUS_SAS_KEY_NAME", "SERVICE_BUS_SAS_KEY_VALUE", "VENTILATION_REST_API_KEY"]:
+        os.environ.setdefault(name, "stand-in")
+    os.environ["VENTILATION_REST_URL"] = fan_server.url
+
+    metrics = MetricsRegistry() if args.metrics else None
+    env = CO2VentilationProductionEnv(bus_service=bus, rest_read_timeout=args.rest_read_timeout,
+                                      control_period=args.control_period, metrics=metrics)
+    bus.publish_interval = args.publish_interval
+    bus.start()
+    rng = np.random.RandomState(args.seed)
+    latencies = np.empty(args.steps)
+    try:
+        env.reset()
+        for i, action in enumerate(rng.randint(4, size=args.steps)):
+            start = time.perf_counter()
+            observation, reward, done, info = env.step(int(action))
+            latencies[i] = time.perf_counter() - start
+            if done:
+                env.reset()
+        missed_samples, missed_deadlines = env.missed_samples, env.missed_deadlines
+    finally:
+        bus.stop()
+        consumer = env.sensor_consumer
+        env.close()
+        fan_server.close()
+
+    percentiles = np.percentile(latencies, [50, 90, 99]) * 1e3
+    return {
+        'steps': args.steps,
+        'steps_per_sec': args.steps / latencies.sum(),
+        'step_latency_ms': {
+            'mean': latencies.mean() * 1e3,
+            'p50': percentiles[0],
+            'p90': percentiles[1],
+            'p99': percentiles[2],
+            'max': latencies.max() * 1e3,
+        },
+        'missed_samples': missed_samples,
+        'missed_deadlines': missed_deadlines,
+        'fan_client': env.fan_client.get_latency_stats(),
+        'fan_server': {
+            'requests': fan_server.nb_requests,
+            'accepted': len(fan_server.commands),
+            'errors': fan_server.nb_errors,
+            'timeouts': fan_server.nb_timeouts,
+            'dropped': fan_server.nb_dropped,
+        },
+        'consumer': {
+            'received': consumer.nb_received,
+            'dropped': consumer.nb_dropped,
+            'invalid': consumer.nb_invalid,
+            'timeouts': consumer.nb_timeouts,
+        } if consumer is not None else None,
+        'service_bus': {
+            'published': bus.nb_published,
+            'dropped': bus.nb_dropped,
+            'delivered': bus.nb_delivered,
+            'deleted': bus.nb_deleted,
+            'timeouts': bus.nb_timeouts,
+        },
+        'metrics': metrics.snapshot() if metrics is not None else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--publish-interval', type=float, default=0.001, help='Seconds between sensor messages')
+    parser.add_argument('--bus-latency', type=float, default=0.0, help='Seconds added to every receive')
+    parser.add_argument('--bus-timeout-rate', type=float, default=0.0)
+    parser.add_argument('--bus-drop-rate', type=float, default=0.0)
+    parser.add_argument('--fan-latency', type=float, default=0.0, help='Seconds added to every fan speed command')
+    parser.add_argument('--fan-error-rate', type=float, default=0.0)
+    parser.add_argument('--fan-timeout-rate', type=float, default=0.0)
+    parser.add_argument('--fan-drop-rate', type=float, default=0.0)
+    parser.add_argument('--fan-hang-time', type=float, default=2.0, help='Seconds before a timed out command is answered')
+    parser.add_argument('--control-period', type=float, default=None, help='Run steps on a fixed control period (seconds)')
+    parser.add_argument('--rest-read-timeout', type=float, default=1.0)
+    parser.add_argument('--metrics', action='store_true', help='Time the step phases with a MetricsRegistry')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    result = run_load_test(args)
+    print(json.dumps(result, indent=2))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    return result
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import gym
+import gym_co2_ventilation  # This will register the custom environment
+from gym_co2_ventilation.numpy_policy import NumpyQPolicy
+
+import logging
+import os
+import time
+
+# Runs a trained policy against the production environment without Keras or TensorFlow.
+# Export the weights saved by test_keras_rl_production.py first:
+#   python -m gym_co2_ventilation.numpy_policy dqn_CO2VentilationProduction-v0_weights.h5f policy.npz --lookup-table
+
+logger = logging.getLogger("Logger")
+ch = logging.StreamHandler()
+formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+logger.setLevel(logging.INFO)
+
+# Initialize logger for logging each step
+step_logger = logging.getLogger("StepLogger")
+step_logger.setLevel(logging.INFO)
+fh = logging.FileHandler(f'co2_ventilation_step_log_{time.strftime("%Y_%m_%d_%H%M")}.log', mode='w')
+step_logger.addHandler(fh)
+step_logger.info("Time,Iteration,Step,FanSpeed,Reward,CO2Level")
+formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d,%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+fh.setFormatter(formatter)
+
+ENV_NAME = 'CO2VentilationProduction-v0'
+
+# Set environment variables used by the CO2VentilationProduction-v0 environment
+os.environ["SERVICE_BUS_NAMESPACE"] = "<replace with your value>"
+os.environ["SERVICE_BUS_SAS_KEY_NAME"] = "<replace with your value>"
+os.environ["SERVICE_BUS_SAS_KEY_VALUE"] = "<replace with your value>"
+os.environ["VENTILATION_REST_URL"] = "<replace with your value>"
+os.environ["VENTILATION_REST_API_KEY"] = "<replace with your value>"
+
+policy = NumpyQPolicy.load('policy.npz')
+
+# Create the environment
+env = gym.make(ENV_NAME)
+
+observation = env.reset()
+while True:
+    action = policy.select_action(observation)
+    observation, reward, done, info = env.step(action)
+    if done:
+        observation = env.reset()
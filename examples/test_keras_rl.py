@@ -1,5 +1,6 @@
 import gym
 import gym_co2_ventilation  # This will register the custom environment
+from gym_co2_ventilation.step_recorder import StepRecorder
 
 import logging
 import numpy as np
@@ -21,14 +22,9 @@ ch.setFormatter(formatter)
 logger.addHandler(ch)
 logger.setLevel(logging.ERROR)
 
-# Initialize logger for logging each step in the continious learning process
-step_logger = logging.getLogger("StepLogger")
-step_logger.setLevel(logging.INFO)
-fh = logging.FileHandler(f'co2_ventilation_step_log_{time.strftime("%Y_%m_%d_%H%M")}.log', mode='w')
-step_logger.addHandler(fh)
-step_logger.info("Time,Iteration,Step,FanSpeed,Reward,CO2Level")
-formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d,%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-fh.setFormatter(formatter)
+# Record each step in a compact binary file (the StepLogger CSV formatting is too slow for the simulator)
+# Convert to CSV with: python -m gym_co2_ventilation.step_recorder <file>.bin <file>.log
+step_recorder = StepRecorder(f'co2_ventilation_step_log_{time.strftime("%Y_%m_%d_%H%M")}.bin')
 
 # Initialize logger for logging summary for each episode in the continious learning process
 episode_logger = logging.getLogger("EpisodeLogger")
@@ -43,6 +39,7 @@ ENV_NAME = 'CO2VentilationSimulator-v0'
 
 # Create the environment
 env = gym.make(ENV_NAME)
+env.unwrapped.step_recorder = step_recorder
 np.random.seed(123)
 env.seed(123)
 nb_actions = env.action_space.n
@@ -81,4 +78,6 @@ dqn.fit(env, nb_max_episode_steps=nb_episode_steps, nb_steps=nb_episode_steps*nb
 dqn.save_weights('dqn_{}_weights.h5f'.format(ENV_NAME), overwrite=True)
 
 # Finally, evaluate our algorithm for 5 episodes.
-dqn.test(env, nb_episodes=10, visualize=True)
\ No newline at end of file
+dqn.test(env, nb_episodes=10, visualize=True)
+
+step_recorder.close()
\ No newline at end of file
@@ -0,0 +1,104 @@
+import gym
+import gym_co2_ventilation  # This will register the custom environment
+from gym_co2_ventilation.actor_learner import ActorLearner
+from gym_co2_ventilation.memory import MemmapSequentialMemory
+
+import logging
+import numpy as np
+import os
+import time
+
+from keras.models import Sequential
+from keras.layers import Dense, Activation, Flatten
+from keras.optimizers import Adam
+
+from rl.agents.dqn import DQNAgent
+from rl.policy import EpsGreedyQPolicy
+
+logger = logging.getLogger("Logger")
+ch = logging.StreamHandler()
+formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+logger.setLevel(logging.INFO)
+
+# Initialize logger for logging summary for each episode in the continious learning process
+episode_logger = logging.getLogger("EpisodeLogger")
+episode_logger.setLevel(logging.INFO)
+fh = logging.FileHandler(f'co2_ventilation_episode_log_{time.strftime("%Y_%m_%d_%H%M")}.log', mode='w')
+episode_logger.addHandler(fh)
+episode_logger.info("Time,Episode,Reward")
+formatter = logging.Formatter(fmt='%(asctime)s.%(msecs)03d,%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+fh.setFormatter(formatter)
+
+#ENV_NAME = 'CO2VentilationProduction-v0'
+#ENV_NAME = 'CO2VentilationSimulator-v0'
+ENV_NAME = 'CO2VentilationSimple-v0'
+
+# Set environment variables used by the CO2VentilationProduction-v0 environment
+os.environ["SERVICE_BUS_NAMESPACE"] = "<replace with your value>"
+os.environ["SERVICE_BUS_SAS_KEY_NAME"] = "<replace with your value>"
+os.environ["SERVICE_BUS_SAS_KEY_VALUE"] = "<replace with your value>"
+os.environ["VENTILATION_REST_URL"] = "<replace with your value>"
+os.environ["VENTILATION_REST_API_KEY"] = "<replace with your value>"
+
+# Create the environment
+env = gym.make(ENV_NAME)
+np.random.seed(123)
+env.seed(123)
+
+nb_actions = env.action_space.n
+
+# Build a neural network model (Dense layers only, so the actor can run it with NumPy)
+model = Sequential()
+model.add(Flatten(input_shape=(1,) + env.observation_space.shape))
+model.add(Dense(16))
+model.add(Activation('relu'))
+model.add(Dense(16))
+model.add(Activation('relu'))
+model.add(Dense(16))
+model.add(Activation('relu'))
+model.add(Dense(nb_actions))
+model.add(Activation('linear'))
+print(model.summary())
+
+nb_episode_steps = 60
+nb_episodes_memory = 1000
+
+# The memory is stored in memory-mapped files, and continues where it left off if the directory exists
+memory = MemmapSequentialMemory('memory', limit=nb_episode_steps*nb_episodes_memory, observation_shape=env.observation_space.shape, window_length=1)
+
+# The agent's policy is not used, the actor explores with epsilon below
+policy = EpsGreedyQPolicy(eps=0.01)
+dqn = DQNAgent(model=model, nb_actions=nb_actions, memory=memory, nb_steps_warmup=10,
+               target_model_update=1e-2, policy=policy)
+dqn.compile(Adam(lr=1e-3), metrics=['mae'])
+
+try:
+    dqn.load_weights('dqn_{}_weights.h5f'.format(ENV_NAME))
+except (OSError):
+    logger.warning ("File not found")
+
+actor_learner = None
+nb_logged_episodes = 0
+
+def save(agent):
+    global nb_logged_episodes
+
+    # Save neural network weights
+    agent.save_weights('dqn_{}_weights.h5f'.format(ENV_NAME), overwrite=True)
+
+    # Save memory (only writes pages changed since the last flush)
+    agent.memory.flush()
+
+    # Write the rewards of the episodes finished since the last checkpoint to the log file
+    episode_rewards = actor_learner.actor.episode_rewards
+    for i in range(nb_logged_episodes, len(episode_rewards)):
+        episode_logger.info(f'{i + 1},{episode_rewards[i]}')
+    nb_logged_episodes = len(episode_rewards)
+    logger.info(f'Saved after {actor_learner.actor.nb_steps} steps, {actor_learner.nb_transitions} transitions and {actor_learner.nb_replay_batches} replay batches')
+
+# Act and learn until interrupted
+actor_learner = ActorLearner(env, dqn, epsilon=0.01, nb_max_episode_steps=nb_episode_steps,
+                             publish_interval=60.0, checkpoint_interval=600.0, save_weights=save)
+actor_learner.run()
@@ -1,10 +1,10 @@
 import gym
 import gym_co2_ventilation  # This will register the custom environment
+from gym_co2_ventilation.memory import MemmapSequentialMemory
 
 import logging
 import numpy as np
 import os
-import pickle
 import requests
 import time
 
@@ -15,7 +15,6 @@ from keras.optimizers import Adam
 from rl.agents.dqn import DQNAgent
 from rl.policy import BoltzmannQPolicy
 from rl.policy import EpsGreedyQPolicy
-from rl.memory import SequentialMemory
 
 logger = logging.getLogger("Logger")
 ch = logging.StreamHandler()
@@ -71,10 +70,8 @@ nb_episode_steps = 60
 nb_episodes = 1
 nb_episodes_memory = 1000
 
-try:
-    memory = pickle.load(open("memory.pkl", "rb"))
-except (FileNotFoundError, EOFError):
-    memory = SequentialMemory(limit=nb_episode_steps*nb_episodes_memory, window_length=1)
+# The memory is stored in memory-mapped files, and continues where it left off if the directory exists
+memory = MemmapSequentialMemory('memory', limit=nb_episode_steps*nb_episodes_memory, observation_shape=env.observation_space.shape, window_length=1)
 
 # Finally, we configure and compile our agent. You can use every built-in Keras optimizer and
 # even the metrics!
@@ -101,8 +98,8 @@ while True:
     # Save neural network weights
     dqn.save_weights('dqn_{}_weights.h5f'.format(ENV_NAME), overwrite=True)
 
-    # Save memory
-    pickle.dump(memory, open("memory.pkl", "wb"))
+    # Save memory (only writes pages changed since the last flush)
+    memory.flush()
 
     # Run test
     test_history = dqn.test(env, nb_episodes=nb_episodes, visualize=True)
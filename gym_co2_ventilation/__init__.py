@@ -16,4 +16,21 @@ register(
     id='CO2VentilationSimple-v0',
     entry_point='gym_co2_ventilation.envs:CO2VentilationSimpleEnv',
     timestep_limit=60,
-)
\ No newline at end of file
+)
+
+register(
+    id='CO2VentilationVectorSimulator-v0',
+    entry_point='gym_co2_ventilation.envs:VectorCO2VentilationSimulatorEnv',
+    kwargs={'num_envs': 1},
+)
+
+register(
+    id='CO2VentilationReplay-v0',
+    entry_point='gym_co2_ventilation.envs:CO2VentilationReplayEnv',
+    timestep_limit=60,
+)
+
+register(
+    id='CO2VentilationMultiZoneProduction-v0',
+    entry_point='gym_co2_ventilation.envs:MultiZoneCO2VentilationProductionEnv',
+)
@@ -0,0 +1,219 @@
+import logging
+import queue
+import threading
+import time
+import numpy as np
+from gym import spaces
+from gym_co2_ventilation.numpy_policy import NumpyQPolicy
+
+def train_on_replay_batch(agent):
+    """Trains a keras-rl DQNAgent on one batch sampled from its replay memory.
+
+    The same update as the training part of DQNAgent.backward(), without storing a
+    transition and without advancing agent.step, which counts environment steps for
+    the warmup, train_interval and hard target model updates. Returns the metrics.
+    """
+    experiences = agent.memory.sample(agent.batch_size)
+    state0_batch = agent.process_state_batch([e.state0 for e in experiences])
+    state1_batch = agent.process_state_batch([e.state1 for e in experiences])
+    reward_batch = np.array([e.reward for e in experiences])
+    action_batch = np.array([e.action for e in experiences])
+    not_terminal1_batch = np.array([0. if e.terminal1 else 1. for e in experiences])
+
+    target_q_values = agent.target_model.predict_on_batch(state1_batch)
+    if agent.enable_double_dqn:
+        actions = np.argmax(agent.model.predict_on_batch(state1_batch), axis=1)
+        q_batch = target_q_values[np.arange(agent.batch_size), actions]
+    else:
+        q_batch = np.max(target_q_values, axis=1).flatten()
+    rs = reward_batch + agent.gamma * q_batch * not_terminal1_batch
+
+    # Only the Q value of the action taken is trained, the mask hides the others
+    targets = np.zeros((agent.batch_size, agent.nb_actions), dtype=np.float32)
+    masks = np.zeros((agent.batch_size, agent.nb_actions), dtype=np.float32)
+    targets[np.arange(agent.batch_size), action_batch] = rs
+    masks[np.arange(agent.batch_size), action_batch] = 1.0
+
+    ins = [state0_batch] if type(agent.model.input) is not list else state0_batch
+    metrics = agent.trainable_model.train_on_batch(ins + [targets, masks], [rs, targets])
+    return [metric for i, metric in enumerate(metrics) if i not in (1, 2)]
+
+class Actor(threading.Thread):
+    """Steps an environment on its own thread and pushes the transitions into a queue.
+
+    Actions come from a NumpyQPolicy (epsilon-greedy), so the thread never touches
+    Keras. A new policy is swapped in with set_policy() between two steps. When the
+    queue is full the transition is dropped instead of delaying the next step.
+    Episodes end when the environment is done or after nb_max_episode_steps.
+    Like DQNAgent, it needs a Discrete action space (one action out of n).
+    """
+
+    def __init__(self, env, policy, transitions, epsilon=0.1, nb_max_episode_steps=60, seed=None):
+        super().__init__(name='Actor', daemon=True)
+        self.logger = logging.getLogger("Logger")
+        self.env = env
+        self.policy = policy
+        self.transitions = transitions
+        self.epsilon = epsilon
+        self.nb_max_episode_steps = nb_max_episode_steps
+        self.random = np.random.RandomState(seed)
+        if not isinstance(env.action_space, spaces.Discrete):
+            raise ValueError(f"Actor needs a Discrete action space, got {env.action_space}")
+        self.nb_actions = env.action_space.n
+
+        self.nb_steps = 0
+        self.nb_episodes = 0
+        self.nb_dropped = 0
+        self.episode_rewards = []
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def set_policy(self, policy):
+        self.policy = policy
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                self._run_episode()
+        except Exception as e:
+            self.logger.exception("Actor failed")
+            self.error = e
+
+    def _run_episode(self):
+        observation = self.env.reset()
+        episode_reward = 0.0
+        for episode_step in range(self.nb_max_episode_steps):
+            if self._stop_event.is_set():
+                return
+            action = self._select_action(observation)
+            next_observation, reward, done, info = self.env.step(action)
+            # Like keras-rl, an episode cut at nb_max_episode_steps ends with a terminal transition
+            done = done or episode_step == self.nb_max_episode_steps - 1
+            # Copied, the environment may reuse its observation buffer
+            self._push(np.array(observation), action, reward, done)
+            observation = next_observation
+            episode_reward += reward
+            self.nb_steps += 1
+            if done:
+                break
+
+        # Like keras-rl, the last observation of an episode is stored with a non-terminal dummy transition
+        self._push(np.array(observation), self._select_action(observation), 0.0, False, dummy=True)
+        self.nb_episodes += 1
+        self.episode_rewards.append(episode_reward)
+
+    def _select_action(self, observation):
+        if self.random.uniform() < self.epsilon:
+            return int(self.random.randint(self.nb_actions))
+        return self.policy.select_action(observation)
+
+    def _push(self, observation, action, reward, terminal, dummy=False):
+        try:
+            self.transitions.put_nowait((observation, action, reward, terminal, dummy))
+        except queue.Full:
+            self.nb_dropped += 1
+
+class ActorLearner:
+    """Acts on an environment and trains a keras-rl DQNAgent at the same time.
+
+    An Actor thread steps the environment at its own pace with a NumPy copy of the
+    agent's model, while this (main) thread keeps training the agent: every new
+    transition is fed to the agent as in DQNAgent.fit(), and in between the agent
+    trains on batches from its replay memory, up to replay_ratio batches per
+    transition. The weights are published to the actor every publish_interval
+    seconds, and save_weights(agent) is called every checkpoint_interval seconds,
+    so checkpointing does not interrupt the control of the building either.
+
+    Keras is only used from the thread that calls run(). The agent must be compiled
+    and its model made of Dense layers (see NumpyQPolicy).
+    """
+
+    def __init__(self, env, agent, epsilon=0.1, nb_max_episode_steps=60, replay_ratio=8, queue_size=10000,
+                 publish_interval=10.0, checkpoint_interval=600.0, save_weights=None, hidden_activation='relu', seed=None):
+        self.logger = logging.getLogger("Logger")
+        self.env = env
+        self.agent = agent
+        self.replay_ratio = replay_ratio
+        self.publish_interval = publish_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.save_weights = save_weights
+        self.hidden_activation = hidden_activation
+
+        self.transitions = queue.Queue(maxsize=queue_size)
+        self.actor = Actor(env, self._get_policy(), self.transitions, epsilon=epsilon,
+                           nb_max_episode_steps=nb_max_episode_steps, seed=seed)
+        self.nb_transitions = 0
+        self.nb_replay_batches = 0
+        self.nb_published = 0
+
+    def run(self, nb_steps=None, duration=None):
+        """Runs until the actor has taken nb_steps steps or duration seconds have passed (or forever)."""
+        self.agent.training = True
+        start = time.monotonic()
+        last_publish = last_checkpoint = start
+        self.actor.start()
+        try:
+            while self.actor.is_alive():
+                if nb_steps is not None and self.actor.nb_steps >= nb_steps:
+                    break
+                now = time.monotonic()
+                if duration is not None and now - start >= duration:
+                    break
+
+                if not self._learn_from_new_transitions():
+                    if not self._learn_from_replay():
+                        # Nothing to learn from yet, wait for the actor
+                        self._learn_from_new_transitions(timeout=1.0)
+
+                if now - last_publish >= self.publish_interval:
+                    self.actor.set_policy(self._get_policy())
+                    self.nb_published += 1
+                    last_publish = now
+                if self.save_weights is not None and now - last_checkpoint >= self.checkpoint_interval:
+                    self.save_weights(self.agent)
+                    last_checkpoint = now
+        finally:
+            self.actor.stop()
+            self.actor.join()
+            # Learn from what is left in the queue before the final checkpoint
+            while self._learn_from_new_transitions():
+                pass
+            if self.save_weights is not None:
+                self.save_weights(self.agent)
+        if self.actor.error is not None:
+            raise self.actor.error
+
+    def _get_policy(self):
+        return NumpyQPolicy.from_weight_list(self.agent.model.get_weights(), self.hidden_activation)
+
+    def _learn_from_new_transitions(self, timeout=None):
+        """Feeds the transitions queued so far to the agent, returns False if there were none."""
+        try:
+            transitions = [self.transitions.get(timeout=timeout) if timeout is not None else self.transitions.get_nowait()]
+        except queue.Empty:
+            return False
+        # Only what is already queued, so a fast actor cannot keep the learner from publishing weights
+        for _ in range(self.transitions.qsize()):
+            transitions.append(self.transitions.get_nowait())
+
+        for observation, action, reward, terminal, dummy in transitions:
+            # Same bookkeeping as DQNAgent.forward(), then backward() stores the transition and trains.
+            # As in DQNAgent.fit(), the dummy transition at the end of an episode is not an environment step
+            self.agent.recent_observation = observation
+            self.agent.recent_action = action
+            if not dummy:
+                self.agent.step += 1
+            self.agent.backward(reward, terminal=terminal)
+            self.nb_transitions += 1
+        return True
+
+    def _learn_from_replay(self):
+        """Trains on one batch from the replay memory, returns False if the replay budget is used up."""
+        if self.agent.step <= self.agent.nb_steps_warmup or self.nb_replay_batches >= self.replay_ratio * self.nb_transitions:
+            return False
+        train_on_replay_batch(self.agent)
+        self.nb_replay_batches += 1
+        return True
@@ -1,3 +1,26 @@
-from gym_co2_ventilation.envs.co2_ventilation_simulator_env import CO2VentilationSimulatorEnv
-from gym_co2_ventilation.envs.co2_ventilation_production_env import CO2VentilationProductionEnv
-from gym_co2_ventilation.envs.co2_ventilation_simple_env import CO2VentilationSimpleEnv
\ No newline at end of file
+import importlib
+
+# The environment classes are imported on first use, so that e.g. simulator workers
+# do not import requests and azure.servicebus for the production environments
+_ENV_MODULES = {
+    'CO2VentilationSimulatorEnv': 'co2_ventilation_simulator_env',
+    'CO2VentilationProductionEnv': 'co2_ventilation_production_env',
+    'CO2VentilationSimpleEnv': 'co2_ventilation_simple_env',
+    'VectorCO2VentilationSimulatorEnv': 'co2_ventilation_vector_simulator_env',
+    'AsyncCO2VentilationProductionEnv': 'co2_ventilation_async_production_env',
+    'CO2VentilationReplayEnv': 'co2_ventilation_replay_env',
+    'MultiZoneCO2VentilationProductionEnv': 'co2_ventilation_multi_zone_production_env',
+}
+
+__all__ = list(_ENV_MODULES)
+
+def __getattr__(name):
+    module_name = _ENV_MODULES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'{__name__}.{module_name}'), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_ENV_MODULES))
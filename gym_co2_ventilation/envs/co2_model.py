@@ -0,0 +1,62 @@
+import numpy as np
+
+# Fan airflow (m3/h) per ventilation fan speed (0..3), 10%, 20%, 50% and 100% of max airflow
+DEFAULT_FAN_AIRFLOW = [150.0, 300.0, 750.0, 1500.0]
+
+class MassBalanceCO2Model:
+    """CO2 mass balance for a well-mixed room:
+
+        dC/dt = G * n / V * 1e6 - Q / V * (C - C_out)
+
+    C is the indoor CO2 level (ppm), G the CO2 generated per person (m3/h), n the
+    number of people in the room, V the room volume (m3), Q the fan airflow (m3/h)
+    and C_out the outdoor CO2 level (ppm).
+
+    One control interval is integrated with substeps explicit Euler steps. The
+    inputs are constant within an interval, so the substeps reduce to a geometric
+    series that is evaluated in closed form. All arguments of step() can be arrays,
+    and a whole batch of rooms is advanced with a handful of array operations.
+    """
+
+    def __init__(self, room_volume=300.0, occupancy=10.0, co2_generation_per_person=0.018,
+                 outdoor_co2_level=420.0, fan_airflow=None, control_interval=60.0, substeps=10):
+        if fan_airflow is None:
+            fan_airflow = DEFAULT_FAN_AIRFLOW
+        if substeps < 1:
+            raise ValueError(f"substeps must be at least 1, got {substeps}")
+
+        self.room_volume = room_volume
+        self.occupancy = occupancy
+        self.co2_generation_per_person = co2_generation_per_person
+        self.outdoor_co2_level = outdoor_co2_level
+        self.fan_airflow = np.array(fan_airflow, dtype=np.float64)
+        self.control_interval = control_interval
+        self.substeps = substeps
+
+        # Air changes per hour for each fan speed, and the length of one substep in hours
+        self.air_change_rate = self.fan_airflow / room_volume
+        self.substep_hours = control_interval / 3600.0 / substeps
+        if np.any(self.air_change_rate * self.substep_hours >= 1.0):
+            raise ValueError("Substeps are too long for the fan airflow, increase substeps")
+
+        # Euler decay factor over all substeps for each fan speed
+        self._decay = (1.0 - self.air_change_rate * self.substep_hours) ** substeps
+
+    def step(self, co2_levels, ventilation_speeds, occupancy=None, outdoor_co2_levels=None):
+        """Returns the CO2 levels one control interval later."""
+        if occupancy is None:
+            occupancy = self.occupancy
+        if outdoor_co2_levels is None:
+            outdoor_co2_levels = self.outdoor_co2_level
+
+        # CO2 generated by the people in the room, in ppm per hour
+        generation = np.multiply(occupancy, self.co2_generation_per_person * 1e6 / self.room_volume)
+        air_change_rate = self.air_change_rate[ventilation_speeds]
+        decay = self._decay[ventilation_speeds]
+
+        # C_k+1 = C_k + h * (generation - rate * (C_k - C_out)) converges towards the equilibrium C_out + generation / rate
+        with np.errstate(divide='ignore', invalid='ignore'):
+            equilibrium = outdoor_co2_levels + generation / air_change_rate
+            ventilated = equilibrium + (co2_levels - equilibrium) * decay
+        unventilated = co2_levels + generation * self.substep_hours * self.substeps
+        return np.where(air_change_rate > 0.0, ventilated, unventilated)
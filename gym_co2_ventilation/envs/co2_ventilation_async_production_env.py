@@ -0,0 +1,124 @@
+import asyncio
+import time
+from gym_co2_ventilation.envs.co2_ventilation_production_env import CO2VentilationProductionEnv
+
+class AsyncCO2VentilationProductionEnv(CO2VentilationProductionEnv):
+    """Production environment with coroutine versions of step() and reset().
+
+    async_step() sends the fan speed command and waits for the next sensor message
+    at the same time, so a slow REST call no longer delays the sensor read. Many
+    ventilation units can be driven from one event loop, e.g.:
+
+        await asyncio.gather(*[env.async_step(action) for env, action in zip(envs, actions)])
+
+    The sensor data is prefetched by the consumer thread, which wakes the event loop
+    when a message arrives, and control_period deadlines are awaited with
+    asyncio.sleep(), so waiting for the environment does not hold any threads. Only
+    the blocking REST call (and the Service Bus receive without prefetch_sensor_data)
+    runs on executor (None = the event loop's default thread pool, shared by all units).
+    Pass a larger ThreadPoolExecutor when driving many units.
+    """
+
+    def __init__(self, reward_config=None, executor=None, **kwargs):
+        super().__init__(reward_config, **kwargs)
+        self.executor = executor
+        self._sensor_data_event = None
+        self._sensor_data_event_loop = None
+        self._sensor_data_listener = None
+
+    async def async_reset(self):
+        # Only waits if no sensor data has been received yet, and never blocks the event loop
+        if self.sensor_consumer is not None and self.nb_co2_samples == 0:
+            await self._wait_for_prefetched_sensor_data(60)
+        return self._reset(sensor_data_timeout=0)
+
+    async def async_step(self, action):
+        if self.metrics is not None:
+            return await self._async_step_with_metrics(action)
+
+        t0_ventilation_speed = self._begin_step(action)
+
+        # Execute action on environment and wait for the next sensor data concurrently
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            loop.run_in_executor(self.executor, self._execute_action, action),
+            self._async_wait_for_sensor_data())
+        self._update_state()
+
+        return self._end_step(t0_ventilation_speed)
+
+    def close(self):
+        if self._sensor_data_listener is not None and self.sensor_consumer is not None:
+            self.sensor_consumer.remove_listener(self._sensor_data_listener)
+        self._sensor_data_listener = None
+        super().close()
+
+    async def _async_step_with_metrics(self, action):
+        start = time.perf_counter()
+        t0_ventilation_speed = self._begin_step(action)
+
+        # The phases overlap, so their timings add up to more than the step
+        timings = {}
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            self._async_timed(timings, 'execute_action', loop.run_in_executor(self.executor, self._execute_action, action)),
+            self._async_timed(timings, 'transition_to_next_state', self._async_wait_for_sensor_data()))
+        self._update_state()
+
+        return self._end_step_with_metrics(t0_ventilation_speed, start, timings)
+
+    async def _async_timed(self, timings, phase, awaitable):
+        start = time.perf_counter()
+        await awaitable
+        timings[phase] = time.perf_counter() - start
+
+    async def _async_wait_for_sensor_data(self):
+        if self.sensor_consumer is None:
+            # Without prefetching, the blocking Service Bus receive needs a thread
+            await asyncio.get_running_loop().run_in_executor(self.executor, self._wait_for_sensor_data)
+            return
+
+        self.logger.info ("Waiting for environment to respond to action...")
+        if self.control_period is not None:
+            await asyncio.sleep(self._advance_deadline())
+            self._process_sensor_data_at_deadline()
+            return
+
+        if not await self._wait_for_prefetched_sensor_data(60):
+            self._sensor_data_timed_out()
+        self._process_prefetched_sensor_data(timeout=0)
+
+    async def _wait_for_prefetched_sensor_data(self, timeout):
+        # Returns True as soon as the consumer has buffered a message, or False after timeout seconds
+        loop = asyncio.get_running_loop()
+        event = self._get_sensor_data_event(loop)
+        deadline = loop.time() + timeout
+        while True:
+            # Cleared before checking, so a message buffered after the check sets it again
+            event.clear()
+            if self.sensor_consumer.has_messages():
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def _get_sensor_data_event(self, loop):
+        # An asyncio.Event of the running loop, set from the consumer thread whenever a message has been buffered
+        if self._sensor_data_event_loop is not loop:
+            if self._sensor_data_listener is not None:
+                self.sensor_consumer.remove_listener(self._sensor_data_listener)
+            event = asyncio.Event()
+
+            def listener():
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(event.set)
+
+            self.sensor_consumer.add_listener(listener)
+            self._sensor_data_event = event
+            self._sensor_data_event_loop = loop
+            self._sensor_data_listener = listener
+        return self._sensor_data_event
@@ -0,0 +1,225 @@
+import gym
+from gym import error, spaces, utils
+from gym.utils import seeding
+import logging
+import numpy as np
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from azure.servicebus import ServiceBusService
+from gym_co2_ventilation.envs.co2_ventilation_production_env import reconcile_event_subscriptions
+from gym_co2_ventilation.envs.observation_buffer import ObservationBufferMixin, OBSERVATION_LOW, OBSERVATION_HIGH
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+from gym_co2_ventilation.envs.sensor_data_consumer import SensorDataDemultiplexer
+from gym_co2_ventilation.envs.ventilation_fan_client import VentilationFanClient, create_session
+
+def parse_zones(zones):
+    """Parses "sensor_id:device_id,sensor_id:device_id,..." into a list of (sensor_id, device_id)."""
+    return [tuple(zone.strip().split(':', 1)) for zone in zones.split(',') if zone.strip()]
+
+class MultiZoneCO2VentilationProductionEnv(ObservationBufferMixin, gym.Env):
+    """Controls the ventilation of many zones (rooms) from one environment.
+
+    zones is a list of (sensor_id, device_id), one per zone, and falls back to the
+    CO2_VENTILATION_ZONES environment variable ("sensor_id:device_id,..."). All zones
+    share one Service Bus subscription (subscription_name, which must not be used by
+    any other environment) with a rule per sensor, one demultiplexing
+    consumer that writes the sensor data into per-zone arrays, and one HTTP session
+    for the fan speed commands, which are sent concurrently. step() takes one action
+    per zone and returns (observations[N,3], rewards[N], dones[N], info) like
+    VectorCO2VentilationSimulatorEnv.
+
+    A step waits until any zone has reported a new CO2 level (at most sensor_timeout
+    seconds), so one silent sensor does not stall the others, and zones without a new
+    value keep their previous one and count a missed sample. With control_period set,
+    steps run on a fixed schedule and use the freshest values at each deadline, which
+    suits sensors that report at different times. reset() starts every zone from its
+    latest CO2 level.
+    """
+    metadata = {'render.modes': ['human']}
+
+    def __init__(self, zones=None, reward_config=None, control_period=None, sensor_timeout=60.0,
+                 rest_connect_timeout=3.05, rest_read_timeout=10.0, rest_max_retries=2, max_workers=16,
+                 bus_service=None, reuse_observation_buffer=False, subscription_name='test'):
+        self.logger = logging.getLogger("Logger")
+        self.__version__ = "0.0.1"
+
+        # Get config from environment variables
+        self.service_bus_namespace = os.environ["SERVICE_BUS_NAMESPACE"]
+        self.service_bus_sas_key_name = os.environ["SERVICE_BUS_SAS_KEY_NAME"]
+        self.service_bus_sas_key_value = os.environ["SERVICE_BUS_SAS_KEY_VALUE"]
+        self.ventilation_rest_url = os.environ["VENTILATION_REST_URL"]
+        self.ventilation_rest_api_key = os.environ["VENTILATION_REST_API_KEY"]
+        if zones is None:
+            zones = parse_zones(os.environ["CO2_VENTILATION_ZONES"])
+        self.sensor_ids = [str(sensor_id) for sensor_id, device_id in zones]
+        self.device_ids = [str(device_id) for sensor_id, device_id in zones]
+        if len(set(self.sensor_ids)) != len(self.sensor_ids):
+            raise ValueError("Every zone needs its own CO2 sensor")
+        self.num_zones = len(zones)
+        self.subscription_name = subscription_name
+        self.logger.info(f"MultiZoneCO2VentilationProductionEnv - Version {self.__version__}, num_zones={self.num_zones}")
+
+        # Define the action_space (one fan speed 0..3 per zone)
+        self.single_action_space = spaces.Discrete(4)
+        self.action_space = spaces.MultiDiscrete([self.single_action_space.n] * self.num_zones)
+
+        # Define the observation_space (one row of [fan speed, CO2 level, CO2 diff] per zone)
+        low = OBSERVATION_LOW.copy()
+        high = OBSERVATION_HIGH.copy()
+        self.single_observation_space = spaces.Box(low, high, dtype=np.float32)
+        self.observation_space = spaces.Box(np.tile(low, (self.num_zones, 1)), np.tile(high, (self.num_zones, 1)), dtype=np.float32)
+
+        self.reward_engine = RewardEngine(**(reward_config or {}))
+
+        # One connection pool for all the fans
+        self.session = create_session(pool_maxsize=max_workers)
+        self.fan_clients = [
+            VentilationFanClient(self.ventilation_rest_url, self.ventilation_rest_api_key, device_id=device_id,
+                                 connect_timeout=rest_connect_timeout, read_timeout=rest_read_timeout,
+                                 max_retries=rest_max_retries, session=self.session)
+            for device_id in self.device_ids]
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='VentilationFanClient')
+
+        self.control_period = control_period
+        self.sensor_timeout = sensor_timeout
+        self._deadline = None
+
+        self.curr_iteration = 0
+        self.curr_step = 0
+        self.total_reward = np.zeros(self.num_zones, dtype=np.float64)
+        self.ventilation_speed = np.zeros(self.num_zones, dtype=np.int64)
+        self.co2_level = np.full(self.num_zones, 400.0)
+        self.co2_diff = np.zeros(self.num_zones, dtype=np.float64)
+        self.previous_co2_level = np.full(self.num_zones, 400.0)
+        self.sensor_staleness = np.full(self.num_zones, np.nan)
+        self.missed_samples = np.zeros(self.num_zones, dtype=np.int64)
+        self._nb_samples_seen = np.zeros(self.num_zones, dtype=np.int64)
+
+        self._init_observation_buffer(reuse_observation_buffer)
+
+        self._initialize_event_subscriber(bus_service)
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_zones)
+        assert np.all((actions >= 0) & (actions < self.single_action_space.n)), "%r invalid" % (actions,)
+        self.curr_step += 1
+        t0_ventilation_speed = self.ventilation_speed
+
+        # Execute actions on environment (change ventilation fan speeds)
+        self._execute_actions(actions)
+
+        # Wait for environment to transition to next state
+        self._wait_for_sensor_data()
+        self.co2_diff = self.co2_level - self.previous_co2_level
+
+        # Get reward for new state
+        rewards = self._get_rewards(self.co2_level, self.ventilation_speed, t0_ventilation_speed)
+        self.total_reward += rewards
+        self.logger.info("Iteration #%d Step #%d, mean reward=%s", self.curr_iteration, self.curr_step, rewards.mean())
+
+        dones = np.zeros(self.num_zones, dtype=bool)
+        info = {
+            'actuation_latency': np.array([client.last_latency for client in self.fan_clients]),
+            'sensor_staleness': self.sensor_staleness.copy(),
+            'missed_samples': self.missed_samples.copy(),
+        }
+        return self._get_observations(), rewards, dones, info
+
+    def reset(self):
+        self.curr_iteration += 1
+        self.curr_step = 0
+        self.total_reward[:] = 0.0
+        self.missed_samples[:] = 0
+        self.ventilation_speed = np.zeros(self.num_zones, dtype=np.int64)   # VentilationFanSpeed1
+        # Start from the latest CO2 levels received, never blocks
+        self._update_co2_levels(*self.sensor_consumer.snapshot())
+        self.co2_diff = self.co2_level - self.previous_co2_level
+        if self.control_period is not None:
+            self._deadline = time.monotonic() + self.control_period
+        return self._get_observations()
+
+    def close(self):
+        if self.sensor_consumer is not None:
+            self.sensor_consumer.stop()
+            self.sensor_consumer = None
+        self.executor.shutdown()
+        self.session.close()
+
+    def render(self, mode='human'):
+        for i in range(self.num_zones):
+            self.logger.info(f"Zone {self.sensor_ids[i]} state: Fan speed={self.ventilation_speed[i] + 1}, CO2={self.co2_level[i]}, CO2Diff={self.co2_diff[i]}")
+
+    def _get_observations(self):
+        observations = self._get_observation_buffer()
+        observations[:, 0] = self.ventilation_speed
+        observations[:, 1] = self.co2_level
+        observations[:, 2] = self.co2_diff
+        return observations
+
+    def _execute_actions(self, actions):
+        self.ventilation_speed = actions.copy()
+        # Only the fans that change speed need a REST call, those are sent concurrently
+        changed = []
+        for i, client in enumerate(self.fan_clients):
+            if client.confirmed_fan_speed == actions[i]:
+                client.set_fan_speed(int(actions[i]))
+            else:
+                changed.append(i)
+        list(self.executor.map(lambda i: self.fan_clients[i].set_fan_speed(int(actions[i])), changed))
+
+    def _wait_for_sensor_data(self):
+        if self.control_period is not None:
+            now = time.monotonic()
+            if now > self._deadline:
+                # The step overran the control period, skip to the next deadline instead of catching up
+                nb_missed = int((now - self._deadline) // self.control_period) + 1
+                self._deadline += nb_missed * self.control_period
+                self.logger.warning("Step overran the control period, skipped %d deadline(s)", nb_missed)
+            time.sleep(max(0.0, self._deadline - time.monotonic()))
+            self._deadline += self.control_period
+            values, receive_times, nb_samples = self.sensor_consumer.snapshot()
+        else:
+            values, receive_times, nb_samples = self.sensor_consumer.wait_for_samples(self._nb_samples_seen, self.sensor_timeout)
+
+        # Zones without a new value keep their CO2 level, so their change is 0
+        self.previous_co2_level = self.co2_level
+        updated = self._update_co2_levels(values, receive_times, nb_samples)
+        self.missed_samples += ~updated
+        if not updated.all():
+            self.logger.warning("No new sensor data from %d of %d zones", np.count_nonzero(~updated), self.num_zones)
+
+    def _update_co2_levels(self, values, receive_times, nb_samples):
+        # Takes the CO2 levels of the zones with samples not seen before, and returns which zones were updated
+        updated = nb_samples > self._nb_samples_seen
+        # The first sample of a zone has nothing to be compared with (the initial 400 is a placeholder)
+        first = updated & (self._nb_samples_seen == 0)
+        self._nb_samples_seen = nb_samples
+        self.sensor_staleness = time.time() - receive_times
+        co2_level = np.where(updated, values, self.co2_level)
+        self.previous_co2_level = np.where(first, co2_level, np.where(updated, self.co2_level, self.previous_co2_level))
+        self.co2_level = co2_level
+        return updated
+
+    def _get_rewards(self, t1_co2_level, current_ventilation_speed, previous_ventilation_speed):
+        # Give a small penalty for changing ventilation fan speed (but, not for the 1st step in an Episode)
+        return self.reward_engine.get_rewards(t1_co2_level, current_ventilation_speed, previous_ventilation_speed,
+                                              penalize_change=self.curr_step > 1)
+
+    def _initialize_event_subscriber(self, bus_service=None):
+        if bus_service is None:
+            bus_service = ServiceBusService(
+                service_namespace = self.service_bus_namespace,
+                shared_access_key_name = self.service_bus_sas_key_name,
+                shared_access_key_value = self.service_bus_sas_key_value)
+        self.bus_service = bus_service
+
+        nb_created = reconcile_event_subscriptions(self.bus_service, self.sensor_ids, 'sensordata', self.subscription_name)
+        self.logger.info('Created %d service bus subscription rule(s) for %d zones', nb_created, self.num_zones)
+
+        self.sensor_consumer = SensorDataDemultiplexer(self.bus_service, self.sensor_ids, 'sensordata', self.subscription_name)
+        self.sensor_consumer.start()
@@ -6,14 +6,51 @@ import json
 import numpy as np
 import os
 import requests
+import time
 from azure.servicebus import ServiceBusService, Message, Topic, Rule
+from gym_co2_ventilation.envs.observation_buffer import ObservationBufferMixin, OBSERVATION_LOW, OBSERVATION_HIGH
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+from gym_co2_ventilation.envs.rolling_features import RollingFeatures, ROLLING_FEATURES_LOW, ROLLING_FEATURES_HIGH
+from gym_co2_ventilation.envs.sensor_data_consumer import SensorDataConsumer
+from gym_co2_ventilation.envs.ventilation_fan_client import VentilationFanClient
 
 CO2_SENSOR_ID = "1401011"
-
-class CO2VentilationProductionEnv(gym.Env):
+VENTILATION_DEVICE_ID = "302"
+
+def reconcile_event_subscriptions(bus_service, event_ids, topic_name='sensordata', subscription_name='test'):
+    """Makes sure the subscription has exactly one rule per event ID, named after it and filtering on it.
+
+    Matching rules are kept, all other rules (including the match-all $Default rule and
+    rules of sensors that are no longer used) are removed. A subscription belongs to one
+    environment: its consumer acknowledges (deletes) every message it receives, so
+    environments sharing a subscription would take each other's messages. Give every
+    environment its own subscription instead. Returns the number of rules created.
+    """
+    expected = {str(event_id): f"EventId='{event_id}'" for event_id in event_ids}
+    existing = set()
+    for rule in bus_service.list_rules(topic_name, subscription_name):
+        if rule.name not in expected or rule.filter_expression != expected[rule.name]:
+            bus_service.delete_rule(topic_name, subscription_name, rule.name)
+        else:
+            existing.add(rule.name)
+
+    nb_created = 0
+    for name, filter_expression in expected.items():
+        if name not in existing:
+            rule = Rule()
+            rule.filter_type = 'SqlFilter'
+            rule.filter_expression = filter_expression
+            bus_service.create_rule(topic_name, subscription_name, name, rule)
+            nb_created += 1
+    return nb_created
+
+class CO2VentilationProductionEnv(ObservationBufferMixin, gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self):
+    def __init__(self, reward_config=None, rest_connect_timeout=3.05, rest_read_timeout=10.0, rest_max_retries=2,
+                 prefetch_sensor_data=True, bus_service=None, control_period=None,
+                 sensor_id=CO2_SENSOR_ID, device_id=VENTILATION_DEVICE_ID, reuse_observation_buffer=False,
+                 metrics=None, rolling_feature_config=None, subscription_name='test'):
         self.logger = logging.getLogger("Logger")
         self.step_logger = logging.getLogger("StepLogger")
         self.__version__ = "0.0.1"
@@ -25,6 +62,9 @@ class CO2VentilationProductionEnv(gym.Env):
         self.service_bus_sas_key_value = os.environ["SERVICE_BUS_SAS_KEY_VALUE"]
         self.ventilation_rest_url = os.environ["VENTILATION_REST_URL"]
         self.ventilation_rest_api_key = os.environ["VENTILATION_REST_API_KEY"]
+        self.sensor_id = sensor_id
+        # The Service Bus subscription (of the sensordata topic) used by this environment only
+        self.subscription_name = subscription_name
 
         # Define the action_space
         # 0=VentilationFanSpeed1
@@ -36,28 +76,72 @@ class CO2VentilationProductionEnv(gym.Env):
         # Define the observation_space
         # First dimension is VentilationFanSpeed (0..3)
         # Second dimension is CO2 level in the air (400...3000)
-        # Third dimension is CO2 change from previous state (-100..100)
-        low = np.array([0, 400, -100])
-        high = np.array([3, 3000, 100])
-        self.observation_space = spaces.Box(low, high)
+        # Third dimension is CO2 change from previous state (-2600..2600)
+        low = OBSERVATION_LOW.copy()
+        high = OBSERVATION_HIGH.copy()
+        # With a rolling_feature_config, the RollingFeatures of the CO2 levels are appended
+        self.rolling_features = None
+        if rolling_feature_config is not None:
+            self.rolling_features = RollingFeatures(**rolling_feature_config)
+            low = np.concatenate((low, ROLLING_FEATURES_LOW))
+            high = np.concatenate((high, ROLLING_FEATURES_HIGH))
+        self.observation_space = spaces.Box(low, high, dtype=np.float32)
+
+        self.reward_engine = RewardEngine(**(reward_config or {}))
+
+        self.fan_client = VentilationFanClient(
+            self.ventilation_rest_url, self.ventilation_rest_api_key, device_id=device_id,
+            connect_timeout=rest_connect_timeout, read_timeout=rest_read_timeout, max_retries=rest_max_retries)
 
         self.curr_iteration = 0
+        self.step_recorder = None
+        self.trace_writer = None
+        self.dataset_writer = None
+        self.current_ventilation_speed = None
         self.current_co2_level = 400
         self.previous_co2_level = 400
-
-        self._initialize_event_subscriber()
+        self.nb_co2_samples = 0
+
+        # State is [fan speed, CO2 level, CO2 change], updated in place
+        self.state = np.zeros(3)
+        self._init_observation_buffer(reuse_observation_buffer)
+
+        # Receive sensor data on a background thread instead of one message per step
+        self.prefetch_sensor_data = prefetch_sensor_data
+        self.sensor_consumer = None
+
+        # With a control_period (seconds), steps run on a fixed schedule and use the freshest
+        # prefetched CO2 level at each deadline instead of waiting for the next sensor message
+        if control_period is not None and not prefetch_sensor_data:
+            raise ValueError("control_period requires prefetch_sensor_data")
+        self.control_period = control_period
+        self.sensor_staleness = None
+        self.missed_samples = 0
+        self.missed_deadlines = 0
+        # Times the environment gave up waiting for sensor data (in reset() and step())
+        self.nb_sensor_timeouts = 0
+        self._deadline = None
+        self._last_sample_time = None
+
+        # With a MetricsRegistry, every step phase is timed and the timings are added to info.
+        # Without one (the default), nothing is timed.
+        self.metrics = metrics
+        self._last_step_end = None
+
+        # A bus_service can be passed in to use something other than Azure Service Bus (e.g. a local stand-in)
+        self._initialize_event_subscriber(bus_service)
+        if metrics is not None:
+            metrics.add_collector(self._collect_metrics)
         
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
 
     def step(self, action):
-        assert self.action_space.contains(action), "%r (%s) invalid"%(action, type(action))
-        
-        self.curr_step += 1
-        self.logger.info("")
-        self.logger.info(f"Iteration #{self.curr_iteration} Step #{self.curr_step}")
-        t0_ventilation_speed, t0_co2_level, t0_co2_diff = self.state
+        if self.metrics is not None:
+            return self._step_with_metrics(action)
+
+        t0_ventilation_speed = self._begin_step(action)
 
         # Execute action on environment (change ventilation fan speed)
         self._execute_action(action)
@@ -65,132 +149,260 @@ class CO2VentilationProductionEnv(gym.Env):
         # Wait for environment to transition to next state
         self._transition_to_next_state()
 
-        # Get reward for new state
-        reward = self._get_reward(self.current_co2_level, self.current_ventilation_speed, t0_ventilation_speed)
-        self.total_reward += reward
-
-        self.logger.info(f"Reward={reward}, Total reward={self.total_reward}")
-        self.step_logger.info(f"{self.curr_iteration},{self.curr_step},{self.current_ventilation_speed + 1},{reward},{self.current_co2_level}")
-
-        done = False
-
-        return np.array(self.state), reward, done, {}
+        return self._end_step(t0_ventilation_speed)
 
     def reset(self):
+        # Start from the latest CO2 level, not the placeholder (the backlog is still being
+        # prefetched right after start-up, so wait for the first sample if there is none yet)
+        return self._reset(sensor_data_timeout=60 if self.nb_co2_samples == 0 else 0)
+
+    def _reset(self, sensor_data_timeout):
         self.curr_iteration += 1
         self.curr_step = 0
         self.total_reward = 0.0
+        self.missed_samples = 0
+        self.missed_deadlines = 0
+        self._last_step_end = None
+        if self.control_period is not None:
+            self._deadline = time.monotonic() + self.control_period
+        if self.sensor_consumer is not None:
+            self._process_prefetched_sensor_data(timeout=sensor_data_timeout)
+            if self.nb_co2_samples == 0:
+                self._sensor_data_timed_out()
+        ventilation_speed = 0   # VentilationFanSpeed1
         co2_level = self.current_co2_level
         co2_diff = self.current_co2_level - self.previous_co2_level
-        self.state = (ventilation_speed, co2_level, co2_diff)
-        return np.array(self.state)
+        self.state[:] = (ventilation_speed, co2_level, co2_diff)
+        return self._get_observation()
+
+    def close(self):
+        if self.sensor_consumer is not None:
+            self.sensor_consumer.stop()
+            self.sensor_consumer = None
+        self.fan_client.close()
 
     def render(self, mode='human'):
         ventilation_speed, co2_level, co2_diff = self.state
-        self.logger.info(f"Environment state: Fan speed={ventilation_speed + 1}, CO2={co2_level}, CO2Diff={co2_diff}")
+        self.logger.info(f"Environment state: Fan speed={int(ventilation_speed) + 1}, CO2={co2_level}, CO2Diff={co2_diff}")
+
+    def _get_observation_time(self):
+        return time.time()
+
+    def _step_with_metrics(self, action):
+        start = time.perf_counter()
+        t0_ventilation_speed = self._begin_step(action)
+        timings = {}
+        self._timed(timings, 'execute_action', self._execute_action, action)
+        self._timed(timings, 'transition_to_next_state', self._transition_to_next_state)
+        return self._end_step_with_metrics(t0_ventilation_speed, start, timings)
+
+    def _timed(self, timings, phase, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        timings[phase] = time.perf_counter() - start
+
+    def _end_step_with_metrics(self, t0_ventilation_speed, start, timings):
+        observation, reward, done, info = self._end_step(t0_ventilation_speed)
+        end = time.perf_counter()
+        if self._last_step_end is not None:
+            # Time between the end of the previous step and the start of this one, spent in the agent
+            timings['agent'] = start - self._last_step_end
+        timings['step'] = end - start
+        self._last_step_end = end
+
+        for phase, seconds in timings.items():
+            self.metrics.observe_time(phase, seconds)
+        self.metrics.observe_reward(reward)
+        self.metrics.increment('steps_total')
+        info['timings'] = timings
+        return observation, reward, done, info
+
+    def _collect_metrics(self):
+        collected = {
+            'fan_commands_total': self.fan_client.nb_commands,
+            'fan_commands_skipped_total': self.fan_client.nb_skipped,
+            'fan_command_failures_total': self.fan_client.nb_failures,
+        }
+        consumer = self.sensor_consumer
+        if consumer is not None:
+            collected['sensor_messages_received_total'] = consumer.nb_received
+            collected['sensor_messages_dropped_total'] = consumer.nb_dropped
+            collected['sensor_messages_invalid_total'] = consumer.nb_invalid
+            # Timeouts of the consumer thread's receive calls and of the environment's waits
+            collected['sensor_receive_timeouts_total'] = consumer.nb_timeouts + self.nb_sensor_timeouts
+        return collected
+
+    def _begin_step(self, action):
+        assert self.action_space.contains(action), "%r (%s) invalid"%(action, type(action))
+        
+        self.curr_step += 1
+        self.logger.info("")
+        self.logger.info("Iteration #%d Step #%d", self.curr_iteration, self.curr_step)
+        if self.dataset_writer is not None:
+            self._t0_state = self.state.copy()
+        return int(self.state[0])
+
+    def _end_step(self, t0_ventilation_speed):
+        # Get reward for new state
+        reward = self._get_reward(self.current_co2_level, self.current_ventilation_speed, t0_ventilation_speed)
+        self.total_reward += reward
+
+        self.logger.info("Reward=%s, Total reward=%s", reward, self.total_reward)
+        self.step_logger.info("%d,%d,%d,%s,%s", self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, self.current_co2_level)
+        if self.step_recorder is not None:
+            self.step_recorder.record(self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, self.current_co2_level)
+
+        done = False
+
+        if self.dataset_writer is not None:
+            self.dataset_writer.append(self.curr_iteration, self.curr_step, self._t0_state, self.current_ventilation_speed, reward, self.state, done)
+
+        info = {'actuation_latency': self.fan_client.last_latency}
+        if self.control_period is not None:
+            info['sensor_staleness'] = self.sensor_staleness
+            info['missed_samples'] = self.missed_samples
+            info['missed_deadlines'] = self.missed_deadlines
+
+        return self._get_observation(), reward, done, info
 
     def _execute_action(self, action):
-        self.logger.info(f"Executing action, setting fan speed to {action + 1}")
+        self.logger.info("Executing action, setting fan speed to %d", action + 1)
         self.current_ventilation_speed = action
         # Call REST service to change the fan speed of the ventilation system
-        fanSpeedCommandId = f'FanSpeed{self.current_ventilation_speed + 1}'
-        data = '{"deviceGroupId":"Ventilation", "deviceId":"302", "capabilityId":"VentilationFan", "commandId":"' + f'{fanSpeedCommandId}' + '", "parameters":""}'
-        try:
-            r = requests.post(f'{self.ventilation_rest_url}?code={self.ventilation_rest_api_key}', data = data)
-            if r.status_code != 200:
-                self.logger.error(f'REST call to change ventilation speed failed: {r.reason}')
-        except:
-            self.logger.exception("Exception from REST call to change ventilation fan speed")
+        self.fan_client.set_fan_speed(self.current_ventilation_speed)
 
     def _transition_to_next_state(self):
+        self._wait_for_sensor_data()
+        self._update_state()
+
+    def _wait_for_sensor_data(self):
         self.logger.info ("Waiting for environment to respond to action...")
+        if self.control_period is not None:
+            self._wait_for_deadline()
+            return
+
+        if self.sensor_consumer is not None:
+            # Process everything prefetched since the last step, only blocks if nothing has arrived yet
+            if self._process_prefetched_sensor_data(timeout=60) == 0:
+                self._sensor_data_timed_out()
+            return
+
         # Note: The timeout should be 120 seconds, but that crashes due to a bug in the Python SDK for Service Bus
         # Wait for new CO2 sensor data to be received
         try:
-            msg = self.bus_service.receive_subscription_message('sensordata', 'test', peek_lock=True, timeout=60)
+            msg = self.bus_service.receive_subscription_message('sensordata', self.subscription_name, peek_lock=True, timeout=60)
             if msg.body is not None:
                 self._process_sensor_data(msg.body)
                 msg.delete()
         except requests.exceptions.ReadTimeout:
             self.logger.exception("ReadTimeout from ServiceBusService.receive_subscription_message")
+            self.nb_sensor_timeouts += 1
+            if self.metrics is not None:
+                self.metrics.increment('sensor_receive_timeouts_total')
+
+    def _sensor_data_timed_out(self):
+        self.logger.warning("No sensor data received within 60 seconds")
+        self.nb_sensor_timeouts += 1
+
+    def _wait_for_deadline(self):
+        time.sleep(self._advance_deadline())
+        self._process_sensor_data_at_deadline()
+
+    def _advance_deadline(self):
+        # Returns the seconds until the deadline of this step, and schedules the next one
+        now = time.monotonic()
+        if now > self._deadline:
+            # The step overran the control period, skip to the next deadline instead of catching up
+            nb_missed = int((now - self._deadline) // self.control_period) + 1
+            self.missed_deadlines += nb_missed
+            self._deadline += nb_missed * self.control_period
+            self.logger.warning("Step overran the control period, skipped %d deadline(s)", nb_missed)
+        delay = max(0.0, self._deadline - now)
+        self._deadline += self.control_period
+        return delay
+
+    def _process_sensor_data_at_deadline(self):
+        # Never blocks, the freshest value is the last one processed
+        self._process_prefetched_sensor_data(timeout=0)
+
+        latest = self.sensor_consumer.get_latest(self.sensor_id)
+        if latest is None or latest[1] == self._last_sample_time:
+            self.missed_samples += 1
+            self.logger.warning("No new sensor data since the previous step")
+        else:
+            self._last_sample_time = latest[1]
+        self.sensor_staleness = None if latest is None else time.time() - latest[1]
 
+    def _process_prefetched_sensor_data(self, timeout):
+        # Processes the messages buffered by the sensor consumer, waiting up to timeout seconds if there are none
+        messages = self.sensor_consumer.get_messages(timeout=timeout)
+        for sensor_id, sensor_value, receive_time in messages:
+            self._process_sensor_value(sensor_id, sensor_value, receive_time)
+        return len(messages)
+
+    def _update_state(self):
         # Update environment state
-        t0_ventilation_speed, t0_co2_level, t0_co2_diff = self.state
-        co2_diff = self.current_co2_level - t0_co2_level
-        self.state = (self.current_ventilation_speed, self.current_co2_level, co2_diff)
+        co2_diff = self.current_co2_level - self.state[1]
+        self.state[:] = (self.current_ventilation_speed, self.current_co2_level, co2_diff)
 
     def _get_reward(self, t1_co2_level, current_ventilation_speed, previous_ventilation_speed):
-        if t1_co2_level < 900:
-            reward = 1.0
-        elif t1_co2_level < 950:
-            reward = 0.9
-        elif t1_co2_level < 1000:
-            reward = 0.8
-        elif t1_co2_level < 1200:
-            reward = 0.4
-        elif t1_co2_level < 1500:
-            reward = -0.2
-        else:
-            reward = -0.6
-
-        # Give penalty for energy consumption
-        # Need to add outdoor / indoor temperature based calculation, but keep it simple for now
-        ventilation_cost = self._get_ventilation_cost(current_ventilation_speed)
-        reward = reward - ventilation_cost
-
         # Give a small penalty for changing ventilation fan speed (but, not for the 1st step in an Episode)
-        if self.curr_step > 1:
-            if current_ventilation_speed != previous_ventilation_speed:
-                reward = reward - 0.1
-
-        return reward
+        return self.reward_engine.get_reward(t1_co2_level, current_ventilation_speed, previous_ventilation_speed,
+                                             penalize_change=self.curr_step > 1)
 
     def _update_co2_level(self, co2_level):
         self.previous_co2_level = self.current_co2_level
         self.current_co2_level = co2_level
-        if self.previous_co2_level == 0:
+        self.nb_co2_samples += 1
+        if self.previous_co2_level == 0 or self.nb_co2_samples == 1:
+            # The first sample has nothing to be compared with (the initial 400 is a placeholder)
             self.previous_co2_level = self.current_co2_level
 
-    def _get_ventilation_cost(self, ventilation_speed):
-        ventilation_speed_cost = [0.0, 0.2, 0.4, 0.8]
-        ventilation_cost = ventilation_speed_cost[ventilation_speed]
-        return ventilation_cost
-
-    def _initialize_event_subscriber(self):
-        self.bus_service = ServiceBusService(
-            service_namespace = self.service_bus_namespace,
-            shared_access_key_name = self.service_bus_sas_key_name,
-            shared_access_key_value = self.service_bus_sas_key_value)
-
-        self._remove_all_event_subscriptions()
-        self._add_event_subscription(CO2_SENSOR_ID)
-        self._remove_all_event_messages()
+    def _initialize_event_subscriber(self, bus_service=None):
+        if bus_service is None:
+            bus_service = ServiceBusService(
+                service_namespace = self.service_bus_namespace,
+                shared_access_key_name = self.service_bus_sas_key_name,
+                shared_access_key_value = self.service_bus_sas_key_value)
+        self.bus_service = bus_service
+
+        if reconcile_event_subscriptions(self.bus_service, [self.sensor_id], 'sensordata', self.subscription_name) == 0:
+            self.logger.info('Service bus subscription rule already matches, skipping rule recreation')
+
+        if self.prefetch_sensor_data:
+            # Pending messages are drained by the consumer thread, so this does not block
+            self.sensor_consumer = SensorDataConsumer(self.bus_service, 'sensordata', self.subscription_name, metrics=self.metrics)
+            self.sensor_consumer.start()
+        else:
+            self._remove_all_event_messages()
 
     def _remove_all_event_messages(self):
         # Clear queue of existing messages
         self.logger.info('Removing any pending sensor data messages from service bus subscription')
         while True:
-            msg = self.bus_service.receive_subscription_message('sensordata', 'test', peek_lock=True, timeout=5)
+            msg = self.bus_service.receive_subscription_message('sensordata', self.subscription_name, peek_lock=True, timeout=5)
             if msg.body is None:
                 break
             self._process_sensor_data(msg.body)
             msg.delete()
 
-    def _remove_all_event_subscriptions(self):
-        rules = self.bus_service.list_rules('sensordata', 'test')
-        for rule in rules:
-            self.bus_service.delete_rule('sensordata', 'test', rule.name)
-
-    def _add_event_subscription(self, event_id):
-        rule = Rule()
-        rule.filter_type = 'SqlFilter'
-        rule.filter_expression = f"EventId='{event_id}'"
-        self.bus_service.create_rule('sensordata', 'test', event_id, rule)
-
     def _process_sensor_data(self, message_body):
         self.logger.info(message_body)
-        sensordata = json.loads(message_body)
-        sensor_id = sensordata['Id']
-        sensor_value = sensordata['Value']
-        if (sensor_id == CO2_SENSOR_ID):
-            self._update_co2_level(sensor_value)
\ No newline at end of file
+        if self.metrics is not None:
+            start = time.perf_counter()
+            sensordata = json.loads(message_body)
+            self.metrics.observe_time('process_sensor_data', time.perf_counter() - start)
+            self.metrics.increment('sensor_messages_received_total')
+        else:
+            sensordata = json.loads(message_body)
+        self._process_sensor_value(sensordata['Id'], sensordata['Value'])
+
+    def _process_sensor_value(self, sensor_id, sensor_value, receive_time=None):
+        if (sensor_id == self.sensor_id):
+            if self.rolling_features is not None:
+                self.rolling_features.update(sensor_value, receive_time or time.time())
+            self._update_co2_level(sensor_value)
+            if self.trace_writer is not None:
+                # Fan speed is -1 until the first action has been executed
+                fan_speed = -1 if self.current_ventilation_speed is None else self.current_ventilation_speed
+                self.trace_writer.append(receive_time or time.time(), sensor_value, fan_speed)
\ No newline at end of file
@@ -0,0 +1,140 @@
+import gym
+from gym import error, spaces, utils
+from gym.utils import seeding
+import logging
+import numpy as np
+import os
+from gym_co2_ventilation.envs.observation_buffer import ObservationBufferMixin, OBSERVATION_LOW, OBSERVATION_HIGH
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+from gym_co2_ventilation.envs.rolling_features import RollingFeatures, ROLLING_FEATURES_LOW, ROLLING_FEATURES_HIGH
+from gym_co2_ventilation.envs.sensor_trace import open_sensor_trace
+
+class CO2VentilationReplayEnv(ObservationBufferMixin, gym.Env):
+    """Replays CO2 levels recorded from CO2VentilationProductionEnv with SensorTraceWriter.
+
+    The trace is memory-mapped read-only, so many worker processes can share one
+    large trace without loading it into memory. Every episode starts at a random
+    offset in the trace. The recorded CO2 levels do not react to the actions, only
+    the reward (ventilation cost and fan change penalty) does.
+    """
+    metadata = {'render.modes': ['human']}
+
+    def __init__(self, trace_path=None, episode_length=60, random_offset=True, reward_config=None,
+                 reuse_observation_buffer=False, rolling_feature_config=None):
+        self.logger = logging.getLogger("Logger")
+        self.step_logger = logging.getLogger("StepLogger")
+        self.__version__ = "0.0.1"
+        self.logger.info(f"CO2VentilationReplayEnv - Version {self.__version__}")
+
+        # Get trace location from environment variable if not given
+        if trace_path is None:
+            trace_path = os.environ["CO2_VENTILATION_TRACE_PATH"]
+        self.trace = open_sensor_trace(trace_path)
+        self.co2_levels = self.trace['co2_level']
+        self.timestamps = self.trace['timestamp']
+        if len(self.co2_levels) < episode_length + 2:
+            raise ValueError(f"Trace {trace_path} has {len(self.co2_levels)} rows, need at least {episode_length + 2}")
+        self.episode_length = episode_length
+        self.random_offset = random_offset
+
+        # Define the action_space
+        # 0=VentilationFanSpeed1
+        # 1=VentilationFanSpeed2
+        # 2=VentilationFanSpeed3
+        # 3=VentilationFanSpeed4
+        self.action_space = spaces.Discrete(4)
+
+        # Define the observation_space
+        # First dimension is VentilationFanSpeed (0..3)
+        # Second dimension is CO2 level in the air (400...3000)
+        # Third dimension is CO2 change from previous state (-2600..2600)
+        low = OBSERVATION_LOW.copy()
+        high = OBSERVATION_HIGH.copy()
+        # With a rolling_feature_config, the RollingFeatures of the CO2 levels are appended
+        self.rolling_features = None
+        if rolling_feature_config is not None:
+            self.rolling_features = RollingFeatures(**rolling_feature_config)
+            low = np.concatenate((low, ROLLING_FEATURES_LOW))
+            high = np.concatenate((high, ROLLING_FEATURES_HIGH))
+        self.observation_space = spaces.Box(low, high, dtype=np.float32)
+
+        self.reward_engine = RewardEngine(**(reward_config or {}))
+
+        self.curr_iteration = 0
+        self.step_recorder = None
+        self.dataset_writer = None
+        self.trace_position = 1
+        self.seed()
+
+        # State is [fan speed, CO2 level, CO2 change], updated in place
+        self.state = np.zeros(3)
+        self._init_observation_buffer(reuse_observation_buffer)
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def step(self, action):
+        assert self.action_space.contains(action), "%r (%s) invalid"%(action, type(action))
+        self.curr_step += 1
+        t0_ventilation_speed = int(self.state[0])
+        if self.dataset_writer is not None:
+            t0_state = self.state.copy()
+
+        # Execute action on environment (change ventilation fan speed)
+        self.current_ventilation_speed = action
+
+        # Move to the next recorded CO2 level
+        self.trace_position += 1
+        co2_level = float(self.co2_levels[self.trace_position])
+        self.state[:] = (self.current_ventilation_speed, co2_level, co2_level - self.state[1])
+        if self.rolling_features is not None:
+            self.rolling_features.update(co2_level, float(self.timestamps[self.trace_position]))
+
+        # Get reward for new state
+        reward = self.reward_engine.get_reward(co2_level, self.current_ventilation_speed, t0_ventilation_speed,
+                                               penalize_change=self.curr_step > 1)
+        self.total_reward += reward
+
+        self.step_logger.info("%d,%d,%d,%s,%s", self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, co2_level)
+        if self.step_recorder is not None:
+            self.step_recorder.record(self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, co2_level)
+
+        # The episode also ends if the trace runs out
+        done = self.trace_position >= len(self.co2_levels) - 1
+
+        if self.dataset_writer is not None:
+            self.dataset_writer.append(self.curr_iteration, self.curr_step, t0_state, action, reward, self.state, done)
+
+        return self._get_observation(), reward, done, {'trace_position': self.trace_position}
+
+    def reset(self):
+        self.curr_iteration += 1
+        self.curr_step = 0
+        self.total_reward = 0.0
+        if self.random_offset:
+            self.trace_position = self.np_random.randint(1, len(self.co2_levels) - self.episode_length)
+        elif self.trace_position + self.episode_length >= len(self.co2_levels):
+            self.trace_position = 1
+        ventilation_speed = 0   # VentilationFanSpeed1
+        co2_level = float(self.co2_levels[self.trace_position])
+        co2_diff = co2_level - float(self.co2_levels[self.trace_position - 1])
+        self.state[:] = (ventilation_speed, co2_level, co2_diff)
+        if self.rolling_features is not None:
+            self._warm_up_rolling_features()
+        return self._get_observation()
+
+    def _warm_up_rolling_features(self):
+        # The episode starts anywhere in the trace, so feed the rows within the window before it
+        self.rolling_features.reset()
+        end = self.trace_position + 1
+        start = np.searchsorted(self.timestamps[:end], self.timestamps[self.trace_position] - self.rolling_features.window, side='right')
+        for timestamp, co2_level in zip(self.timestamps[start:end], self.co2_levels[start:end]):
+            self.rolling_features.update(co2_level, float(timestamp))
+
+    def render(self, mode='human'):
+        ventilation_speed, co2_level, co2_diff = self.state
+        self.logger.info(f"Environment state: Fan speed={int(ventilation_speed) + 1}, CO2={co2_level}, CO2Diff={co2_diff}")
+
+    def _get_observation_time(self):
+        return float(self.timestamps[self.trace_position])
@@ -4,11 +4,13 @@ from gym.utils import seeding
 import logging
 import numpy as np
 import random
+from gym_co2_ventilation.envs.observation_buffer import ObservationBufferMixin
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
 
-class CO2VentilationSimpleEnv(gym.Env):
+class CO2VentilationSimpleEnv(ObservationBufferMixin, gym.Env):
     metadata = {'render.modes': ['human']}
 
-    def __init__(self):
+    def __init__(self, reward_config=None, reuse_observation_buffer=False):
         self.logger = logging.getLogger("Logger")
         self.step_logger = logging.getLogger("StepLogger")
         self.__version__ = "0.0.1"
@@ -23,11 +25,19 @@ class CO2VentilationSimpleEnv(gym.Env):
 
         # Define the observation_space
         # First dimension is VentilationFanSpeed (0..3)
-        low = np.array([0, 400, 0])
-        high = np.array([3, 3000, 0])
-        self.observation_space = spaces.Box(low, high)
+        low = np.array([0, 400, 0], dtype=np.float32)
+        high = np.array([3, 3000, 0], dtype=np.float32)
+        self.observation_space = spaces.Box(low, high, dtype=np.float32)
+
+        self.reward_engine = RewardEngine(**(reward_config or {}))
 
         self.curr_iteration = 0
+        self.step_recorder = None
+        self.dataset_writer = None
+
+        # State is [fan speed, 400, 0], updated in place
+        self.state = np.zeros(3)
+        self._init_observation_buffer(reuse_observation_buffer)
         
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
@@ -37,8 +47,10 @@ class CO2VentilationSimpleEnv(gym.Env):
         assert self.action_space.contains(action), "%r (%s) invalid"%(action, type(action))
         self.curr_step += 1
         self.logger.info("")
-        self.logger.info(f"Iteration #{self.curr_iteration} Step #{self.curr_step}")
-        t0_ventilation_speed, dummy1, dummy2 = self.state
+        self.logger.info("Iteration #%d Step #%d", self.curr_iteration, self.curr_step)
+        t0_ventilation_speed = int(self.state[0])
+        if self.dataset_writer is not None:
+            t0_state = self.state.copy()
 
         # Execute action on environment (change ventilation fan speed)
         self._execute_action(action)
@@ -50,51 +62,41 @@ class CO2VentilationSimpleEnv(gym.Env):
         reward = self._get_reward(self.current_ventilation_speed, t0_ventilation_speed)
         self.total_reward += reward
 
-        self.logger.info(f"Reward={reward}, Total reward={self.total_reward}")
-        self.step_logger.info(f"{self.curr_iteration},{self.curr_step},{self.current_ventilation_speed + 1},{reward}")
+        self.logger.info("Reward=%s, Total reward=%s", reward, self.total_reward)
+        self.step_logger.info("%d,%d,%d,%s", self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward)
+        if self.step_recorder is not None:
+            self.step_recorder.record(self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, 400)
 
         done = False
 
-        return np.array(self.state), reward, done, {}
+        if self.dataset_writer is not None:
+            self.dataset_writer.append(self.curr_iteration, self.curr_step, t0_state, action, reward, self.state, done)
+
+        return self._get_observation(), reward, done, {}
 
     def reset(self):
         self.curr_iteration += 1
         self.curr_step = 0
         self.total_reward = 0.0
         ventilation_speed = random.randint(0 , self.action_space.n - 1)
-        self.state = (ventilation_speed, 400, 0)
-        return np.array(self.state)
+        self.state[:] = (ventilation_speed, 400, 0)
+        return self._get_observation()
 
     def render(self, mode='human'):
-        ventilation_speed, dummy1, dummy2 = self.state
-        print(f"Environment state: Fan speed={ventilation_speed + 1}")
+        print(f"Environment state: Fan speed={int(self.state[0]) + 1}")
 
     def _execute_action(self, action):
-        self.logger.info(f"Executing action, setting fan speed to {action + 1}")
+        self.logger.info("Executing action, setting fan speed to %d", action + 1)
         self.current_ventilation_speed = action
 
     def _transition_to_next_state(self):
         self.logger.info ("Waiting for environment to respond to action...")
                 
         # Return new environment state
-        self.state = (self.current_ventilation_speed, 400, 0)
+        self.state[:] = (self.current_ventilation_speed, 400, 0)
 
     def _get_reward(self, current_ventilation_speed, previous_ventilation_speed):
-        reward = 1.0
-
-        # Give penalty for energy consumption
-        # Need to add outdoor / indoor temperature based calculation, but keep it simple for now
-        ventilation_cost = self._get_ventilation_cost(current_ventilation_speed)
-        reward = reward - ventilation_cost
-
+        # CO2 level is fixed at 400 in this environment, so only the ventilation cost varies
         # Give a small penalty for changing ventilation fan speed (but, not for the 1st step in an Episode)
-        if self.curr_step > 1:
-            if current_ventilation_speed != previous_ventilation_speed:
-                reward = reward - 0.1
-
-        return reward
-        
-    def _get_ventilation_cost(self, ventilation_speed):
-        ventilation_speed_cost = [0.0, 0.2, 0.4, 0.8]
-        ventilation_cost = ventilation_speed_cost[ventilation_speed]
-        return ventilation_cost
\ No newline at end of file
+        return self.reward_engine.get_reward(400, current_ventilation_speed, previous_ventilation_speed,
+                                             penalize_change=self.curr_step > 1)
\ No newline at end of file
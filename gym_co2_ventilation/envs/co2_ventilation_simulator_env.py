@@ -3,11 +3,50 @@ from gym import error, spaces, utils
 from gym.utils import seeding
 import logging
 import numpy as np
+import os
+from gym_co2_ventilation.envs.co2_model import MassBalanceCO2Model
+from gym_co2_ventilation.envs.observation_buffer import ObservationBufferMixin, OBSERVATION_LOW, OBSERVATION_HIGH
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+from gym_co2_ventilation.envs.rolling_features import RollingFeatures, ROLLING_FEATURES_LOW, ROLLING_FEATURES_HIGH, ROLLING_FEATURES_STATE_DTYPE
+from gym_co2_ventilation.envs.scenario_library import ScenarioLibrary
 
-class CO2VentilationSimulatorEnv(gym.Env):
+# State of one simulated room, as returned by clone_state(). current_ventilation_speed is -1 before the first step.
+ROOM_STATE_DTYPE = np.dtype([
+    ('state', '<f8', (3,)),
+    ('current_ventilation_speed', '<i8'),
+    ('current_co2_level', '<f8'),
+    ('previous_co2_level', '<f8'),
+    ('curr_iteration', '<i8'),
+    ('curr_step', '<i8'),
+    ('total_reward', '<f8'),
+])
+# Room state, position in the scenario library (-1 without one), simulated time and rolling features
+# (zeros without a rolling_feature_config) and the state of the MT19937 generator behind np_random
+# (numpy.random.RandomState.get_state())
+SIMULATOR_STATE_DTYPE = np.dtype(ROOM_STATE_DTYPE.descr + [
+    ('scenario_id', '<i8'),
+    ('scenario_step', '<i8'),
+    ('sensor_time', '<f8'),
+    ('rolling_features', ROLLING_FEATURES_STATE_DTYPE),
+    ('rng_key', '<u4', (624,)),
+    ('rng_pos', '<i8'),
+    ('rng_has_gauss', '<i8'),
+    ('rng_cached_gaussian', '<f8'),
+])
+
+class CO2VentilationSimulatorEnv(ObservationBufferMixin, gym.Env):
+    """Simulated room, with the CO2 level following MassBalanceCO2Model.
+
+    With a scenario library (scenario_path, or the CO2_VENTILATION_SCENARIO_PATH
+    environment variable), the occupancy and outdoor CO2 level of every step come
+    from a scenario, and the outdoor temperature is passed to the reward. Every
+    episode starts in scenario_id at time_offset seconds, or in a random scenario
+    at a random time when they are None, and wraps around at the end of the scenario.
+    """
     metadata = {'render.modes': ['human']}
 
-    def __init__(self):
+    def __init__(self, reward_config=None, co2_model_config=None, reuse_observation_buffer=False,
+                 rolling_feature_config=None, scenario_path=None, scenario_id=None, time_offset=None):
         self.logger = logging.getLogger("Logger")
         self.step_logger = logging.getLogger("StepLogger")
         self.__version__ = "0.0.1"
@@ -23,25 +62,113 @@ class CO2VentilationSimulatorEnv(gym.Env):
         # Define the observation_space
         # First dimension is VentilationFanSpeed (0..3)
         # Second dimension is CO2 level in the air (400...3000)
-        # Third dimension is CO2 change from previous state (-100..100)
-        low = np.array([0, 400, -100])
-        high = np.array([3, 3000, 100])
-        self.observation_space = spaces.Box(low, high)
+        # Third dimension is CO2 change from previous state (-2600..2600)
+        low = OBSERVATION_LOW.copy()
+        high = OBSERVATION_HIGH.copy()
+        # With a rolling_feature_config, the RollingFeatures of the CO2 levels are appended
+        self.rolling_features = None
+        if rolling_feature_config is not None:
+            self.rolling_features = RollingFeatures(**rolling_feature_config)
+            low = np.concatenate((low, ROLLING_FEATURES_LOW))
+            high = np.concatenate((high, ROLLING_FEATURES_HIGH))
+        self.observation_space = spaces.Box(low, high, dtype=np.float32)
+
+        self.reward_engine = RewardEngine(**(reward_config or {}))
+
+        # Room volume, occupancy, fan airflow etc. can be changed through the co2_model_config registration kwarg
+        self.co2_model = MassBalanceCO2Model(**(co2_model_config or {}))
+
+        # Memory-mapped, so many workers can share one library
+        if scenario_path is None:
+            scenario_path = os.environ.get("CO2_VENTILATION_SCENARIO_PATH")
+        self.scenarios = None if scenario_path is None else ScenarioLibrary(scenario_path)
+        self.start_scenario_id = scenario_id
+        self.start_time_offset = time_offset
+        self.scenario_id = None
+        self.scenario_step = None
+        self.outdoor_temperature = None
+        if self.scenarios is not None:
+            # Scenario steps per control interval
+            self._scenario_stride = max(1, int(round(self.co2_model.control_interval / self.scenarios.step_seconds)))
 
         self.curr_iteration = 0
+        self.curr_step = 0
+        self.total_reward = 0.0
+        self.step_recorder = None
+        self.dataset_writer = None
+        self.current_ventilation_speed = None
         self.current_co2_level = 400
         self.previous_co2_level = 400
+        self.seed()
+
+        # Simulated time (seconds) of the latest CO2 level, one control interval per step
+        self.sensor_time = 0.0
+        if self.rolling_features is not None:
+            self.rolling_features.update(self.current_co2_level, self.sensor_time)
+
+        # State is [fan speed, CO2 level, CO2 change], updated in place
+        self.state = np.zeros(3)
+        self._init_observation_buffer(reuse_observation_buffer)
         
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
         return [seed]
 
+    def clone_state(self, out=None):
+        """Snapshot of the simulation as a SIMULATOR_STATE_DTYPE record, restored with restore_state().
+
+        Pass out (an element of a SIMULATOR_STATE_DTYPE array, e.g. snapshots[i]) to write
+        the snapshot there instead of allocating a new record. The observation buffer,
+        recorders and writers are not part of the snapshot.
+        """
+        if out is None:
+            out = np.zeros((), dtype=SIMULATOR_STATE_DTYPE)
+        out['state'] = self.state
+        out['current_ventilation_speed'] = -1 if self.current_ventilation_speed is None else self.current_ventilation_speed
+        out['current_co2_level'] = self.current_co2_level
+        out['previous_co2_level'] = self.previous_co2_level
+        out['curr_iteration'] = self.curr_iteration
+        out['curr_step'] = self.curr_step
+        out['total_reward'] = self.total_reward
+        out['scenario_id'] = -1 if self.scenario_id is None else self.scenario_id
+        out['scenario_step'] = -1 if self.scenario_step is None else self.scenario_step
+        out['sensor_time'] = self.sensor_time
+        if self.rolling_features is not None:
+            self.rolling_features.get_state(out=out['rolling_features'])
+        algorithm, key, pos, has_gauss, cached_gaussian = self.np_random.get_state()
+        out['rng_key'] = key
+        out['rng_pos'] = pos
+        out['rng_has_gauss'] = has_gauss
+        out['rng_cached_gaussian'] = cached_gaussian
+        return out
+
+    def restore_state(self, snapshot):
+        """Restores a snapshot returned by clone_state(), e.g. to roll out another action from the same state."""
+        self.state[:] = snapshot['state']
+        current_ventilation_speed = int(snapshot['current_ventilation_speed'])
+        self.current_ventilation_speed = None if current_ventilation_speed < 0 else current_ventilation_speed
+        self.current_co2_level = float(snapshot['current_co2_level'])
+        self.previous_co2_level = float(snapshot['previous_co2_level'])
+        self.curr_iteration = int(snapshot['curr_iteration'])
+        self.curr_step = int(snapshot['curr_step'])
+        self.total_reward = float(snapshot['total_reward'])
+        if snapshot['scenario_id'] >= 0:
+            self.scenario_id = int(snapshot['scenario_id'])
+            self.scenario_step = int(snapshot['scenario_step'])
+        self.sensor_time = float(snapshot['sensor_time'])
+        if self.rolling_features is not None:
+            self.rolling_features.set_state(snapshot['rolling_features'])
+        self.np_random.set_state(('MT19937', snapshot['rng_key'], int(snapshot['rng_pos']),
+                                  int(snapshot['rng_has_gauss']), float(snapshot['rng_cached_gaussian'])))
+
     def step(self, action):
         assert self.action_space.contains(action), "%r (%s) invalid"%(action, type(action))
         self.curr_step += 1
         self.logger.info("")
-        self.logger.info(f"Iteration #{self.curr_iteration} Step #{self.curr_step}")
-        t0_ventilation_speed, t0_co2_level, t0_co2_diff = self.state
+        self.logger.info("Iteration #%d Step #%d", self.curr_iteration, self.curr_step)
+        t0_ventilation_speed = int(self.state[0])
+        if self.dataset_writer is not None:
+            t0_state = self.state.copy()
 
         # Execute action on environment (change ventilation fan speed)
         self._execute_action(action)
@@ -53,88 +180,83 @@ class CO2VentilationSimulatorEnv(gym.Env):
         reward = self._get_reward(self.current_co2_level, self.current_ventilation_speed, t0_ventilation_speed)
         self.total_reward += reward
 
-        self.logger.info(f"Reward={reward}, Total reward={self.total_reward}")
-        self.step_logger.info(f"{self.curr_iteration},{self.curr_step},{self.current_ventilation_speed + 1},{reward},{self.current_co2_level}")
+        self.logger.info("Reward=%s, Total reward=%s", reward, self.total_reward)
+        self.step_logger.info("%d,%d,%d,%s,%s", self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, self.current_co2_level)
+        if self.step_recorder is not None:
+            self.step_recorder.record(self.curr_iteration, self.curr_step, self.current_ventilation_speed + 1, reward, self.current_co2_level)
 
         done = False
 
-        return np.array(self.state), reward, done, {}
+        if self.dataset_writer is not None:
+            self.dataset_writer.append(self.curr_iteration, self.curr_step, t0_state, action, reward, self.state, done)
+
+        return self._get_observation(), reward, done, {}
 
     def reset(self):
         self.curr_iteration += 1
         self.curr_step = 0
         self.total_reward = 0.0
+        if self.scenarios is not None:
+            self._start_scenario()
         ventilation_speed = 0   # VentilationFanSpeed1
         co2_level = self.current_co2_level
         co2_diff = self.current_co2_level - self.previous_co2_level
-        self.state = (ventilation_speed, co2_level, co2_diff)
-        return np.array(self.state)
+        self.state[:] = (ventilation_speed, co2_level, co2_diff)
+        return self._get_observation()
 
     def render(self, mode='human'):
         ventilation_speed, co2_level, co2_diff = self.state
-        self.logger.info(f"Environment state: Fan speed={ventilation_speed + 1}, CO2={co2_level}, CO2Diff={co2_diff}")
+        self.logger.info(f"Environment state: Fan speed={int(ventilation_speed) + 1}, CO2={co2_level}, CO2Diff={co2_diff}")
+
+    def _get_observation_time(self):
+        return self.sensor_time
 
     def _execute_action(self, action):
-        self.logger.info(f"Executing action, setting fan speed to {action + 1}")
+        self.logger.info("Executing action, setting fan speed to %d", action + 1)
         self.current_ventilation_speed = action
 
     def _transition_to_next_state(self):
         self.logger.info ("Waiting for environment to respond to action...")
                 
         # Compute next state
-        new_co2_diff = 0
-        #new_co2_diff = 20 - (self._get_ventilation_volume(self.current_ventilation_speed) * 50)
-        new_co2_level = self.current_co2_level + new_co2_diff
+        if self.scenarios is None:
+            new_co2_level = float(self.co2_model.step(self.current_co2_level, self.current_ventilation_speed))
+        else:
+            # Conditions at the start of the control interval, the outdoor temperature is used by the reward
+            occupancy, self.outdoor_temperature, outdoor_co2_level = self.scenarios.get(self.scenario_id, self.scenario_step)
+            new_co2_level = float(self.co2_model.step(self.current_co2_level, self.current_ventilation_speed,
+                                                      occupancy=occupancy, outdoor_co2_levels=outdoor_co2_level))
+            self.scenario_step = (self.scenario_step + self._scenario_stride) % self.scenarios.nb_steps
         if new_co2_level < 400:
             new_co2_level = 400
         elif new_co2_level > 3000:
             new_co2_level = 3000
 
         self._update_co2_level(new_co2_level)
+        self.sensor_time += self.co2_model.control_interval
+        if self.rolling_features is not None:
+            self.rolling_features.update(self.current_co2_level, self.sensor_time)
 
         # Update environment state
-        t0_ventilation_speed, t0_co2_level, t0_co2_diff = self.state
-        co2_diff = self.current_co2_level - t0_co2_level
-        self.state = (self.current_ventilation_speed, self.current_co2_level, co2_diff)
+        co2_diff = self.current_co2_level - self.state[1]
+        self.state[:] = (self.current_ventilation_speed, self.current_co2_level, co2_diff)
 
     def _get_reward(self, t1_co2_level, current_ventilation_speed, previous_ventilation_speed):
-        if t1_co2_level < 900:
-            reward = 1.0
-        elif t1_co2_level < 950:
-            reward = 0.9
-        elif t1_co2_level < 1000:
-            reward = 0.8
-        elif t1_co2_level < 1200:
-            reward = 0.4
-        elif t1_co2_level < 1500:
-            reward = -0.2
-        else:
-            reward = -0.6
-
-        # Give penalty for energy consumption
-        # Need to add outdoor / indoor temperature based calculation, but keep it simple for now
-        ventilation_cost = self._get_ventilation_cost(current_ventilation_speed)
-        reward = reward - ventilation_cost
-
         # Give a small penalty for changing ventilation fan speed (but, not for the 1st step in an Episode)
-        if self.curr_step > 1:
-            if current_ventilation_speed != previous_ventilation_speed:
-                reward = reward - 0.1
+        return self.reward_engine.get_reward(t1_co2_level, current_ventilation_speed, previous_ventilation_speed,
+                                             penalize_change=self.curr_step > 1, outdoor_temperature=self.outdoor_temperature)
 
-        return reward
+    def _start_scenario(self):
+        self.scenario_id = self.start_scenario_id
+        if self.scenario_id is None:
+            self.scenario_id = int(self.np_random.randint(self.scenarios.nb_scenarios))
+        if self.start_time_offset is None:
+            self.scenario_step = int(self.np_random.randint(self.scenarios.nb_steps))
+        else:
+            self.scenario_step = int(self.start_time_offset // self.scenarios.step_seconds) % self.scenarios.nb_steps
 
     def _update_co2_level(self, co2_level):
         self.previous_co2_level = self.current_co2_level
         self.current_co2_level = co2_level
         if self.previous_co2_level == 0:
-            self.previous_co2_level = self.current_co2_level
-
-    def _get_ventilation_volume(self, ventilation_speed):
-        ventilation_speed_volume = [0.1, 0.2, 0.5, 1.0]
-        ventilation_volume = ventilation_speed_volume[ventilation_speed]
-        return ventilation_volume
-        
-    def _get_ventilation_cost(self, ventilation_speed):
-        ventilation_speed_cost = [0.0, 0.2, 0.4, 0.8]
-        ventilation_cost = ventilation_speed_cost[ventilation_speed]
-        return ventilation_cost
\ No newline at end of file
+            self.previous_co2_level = self.current_co2_level
\ No newline at end of file
@@ -0,0 +1,155 @@
+import gym
+from gym import error, spaces, utils
+from gym.utils import seeding
+import logging
+import numpy as np
+from gym_co2_ventilation.envs.co2_model import MassBalanceCO2Model
+from gym_co2_ventilation.envs.observation_buffer import ObservationBufferMixin, OBSERVATION_LOW, OBSERVATION_HIGH
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+from gym_co2_ventilation.envs.co2_ventilation_simulator_env import ROOM_STATE_DTYPE
+
+class VectorCO2VentilationSimulatorEnv(ObservationBufferMixin, gym.Env):
+    """Steps num_envs independent simulated rooms at once.
+
+    Same dynamics and reward as CO2VentilationSimulatorEnv, but the state of all
+    rooms is kept in contiguous arrays and updated with one vectorized call per step.
+    Rooms that reach max_episode_steps are reset automatically.
+    """
+    metadata = {'render.modes': ['human']}
+
+    def __init__(self, num_envs=1, max_episode_steps=60, reward_config=None, co2_model_config=None,
+                 reuse_observation_buffer=False):
+        self.logger = logging.getLogger("Logger")
+        self.__version__ = "0.0.1"
+        self.logger.info(f"VectorCO2VentilationSimulatorEnv - Version {self.__version__}, num_envs={num_envs}")
+
+        self.num_envs = num_envs
+        self.max_episode_steps = max_episode_steps
+
+        # Define the action_space (one fan speed 0..3 per room)
+        self.single_action_space = spaces.Discrete(4)
+        self.action_space = spaces.MultiDiscrete([self.single_action_space.n] * num_envs)
+
+        # Define the observation_space (one row of [fan speed, CO2 level, CO2 diff] per room)
+        low = OBSERVATION_LOW.copy()
+        high = OBSERVATION_HIGH.copy()
+        self.single_observation_space = spaces.Box(low, high, dtype=np.float32)
+        self.observation_space = spaces.Box(np.tile(low, (num_envs, 1)), np.tile(high, (num_envs, 1)), dtype=np.float32)
+
+        self.reward_engine = RewardEngine(**(reward_config or {}))
+        self.co2_model = MassBalanceCO2Model(**(co2_model_config or {}))
+
+        self.curr_iteration = np.zeros(num_envs, dtype=np.int64)
+        self.curr_step = np.zeros(num_envs, dtype=np.int64)
+        self.total_reward = np.zeros(num_envs, dtype=np.float64)
+        self.ventilation_speed = np.zeros(num_envs, dtype=np.int64)
+        self.co2_level = np.full(num_envs, 400.0)
+        self.co2_diff = np.zeros(num_envs, dtype=np.float64)
+        self.previous_co2_level = np.full(num_envs, 400.0)
+
+        self._init_observation_buffer(reuse_observation_buffer)
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        return [seed]
+
+    def clone_state(self, indices=None):
+        """Snapshots of the rooms at indices (default all) as a ROOM_STATE_DTYPE array, restored with restore_state()."""
+        if indices is None:
+            indices = slice(None)
+        ventilation_speed = self.ventilation_speed[indices]
+        snapshots = np.zeros(len(ventilation_speed), dtype=ROOM_STATE_DTYPE)
+        snapshots['state'][:, 0] = ventilation_speed
+        snapshots['state'][:, 1] = self.co2_level[indices]
+        snapshots['state'][:, 2] = self.co2_diff[indices]
+        snapshots['current_ventilation_speed'] = ventilation_speed
+        snapshots['current_co2_level'] = self.co2_level[indices]
+        snapshots['previous_co2_level'] = self.previous_co2_level[indices]
+        snapshots['curr_iteration'] = self.curr_iteration[indices]
+        snapshots['curr_step'] = self.curr_step[indices]
+        snapshots['total_reward'] = self.total_reward[indices]
+        return snapshots
+
+    def restore_state(self, snapshots, indices=None):
+        """Restores the rooms at indices (default all) from snapshots.
+
+        snapshots are returned by clone_state() of this environment, or of
+        CO2VentilationSimulatorEnv (the generator state is ignored, the rooms do
+        not use it). A single snapshot is copied to all the rooms at indices, e.g.
+        to roll out many action sequences from the same state at once.
+        """
+        if indices is None:
+            indices = slice(None)
+        state = snapshots['state']
+        self.ventilation_speed[indices] = state[..., 0]
+        self.co2_level[indices] = snapshots['current_co2_level']
+        self.co2_diff[indices] = state[..., 2]
+        self.previous_co2_level[indices] = snapshots['previous_co2_level']
+        self.curr_iteration[indices] = snapshots['curr_iteration']
+        self.curr_step[indices] = snapshots['curr_step']
+        self.total_reward[indices] = snapshots['total_reward']
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        assert np.all((actions >= 0) & (actions < self.single_action_space.n)), "%r invalid" % (actions,)
+        self.curr_step += 1
+        t0_ventilation_speed = self.ventilation_speed
+        t0_co2_level = self.co2_level
+
+        # Execute action on environment (change ventilation fan speed)
+        self.ventilation_speed = actions.copy()
+
+        # Compute next state
+        self._transition_to_next_state(t0_co2_level)
+
+        # Get reward for new state
+        rewards = self._get_rewards(self.co2_level, self.ventilation_speed, t0_ventilation_speed)
+        self.total_reward += rewards
+
+        dones = self.curr_step >= self.max_episode_steps
+        observations = self._get_observations()
+        info = {}
+        if dones.any():
+            info['terminal_observation'] = observations[dones]
+            info['episode_reward'] = self.total_reward[dones]
+            self._reset_envs(dones)
+            observations = self._get_observations()
+
+        return observations, rewards, dones, info
+
+    def reset(self):
+        self._reset_envs(np.ones(self.num_envs, dtype=bool))
+        return self._get_observations()
+
+    def render(self, mode='human'):
+        for i in range(self.num_envs):
+            self.logger.info(f"Environment #{i} state: Fan speed={self.ventilation_speed[i] + 1}, CO2={self.co2_level[i]}, CO2Diff={self.co2_diff[i]}")
+
+    def _reset_envs(self, mask):
+        self.curr_iteration[mask] += 1
+        self.curr_step[mask] = 0
+        self.total_reward[mask] = 0.0
+        self.ventilation_speed[mask] = 0   # VentilationFanSpeed1
+        self.co2_diff[mask] = self.co2_level[mask] - self.previous_co2_level[mask]
+
+    def _get_observations(self):
+        observations = self._get_observation_buffer()
+        observations[:, 0] = self.ventilation_speed
+        observations[:, 1] = self.co2_level
+        observations[:, 2] = self.co2_diff
+        return observations
+
+    def _transition_to_next_state(self, t0_co2_level):
+        new_co2_level = np.clip(self.co2_model.step(self.co2_level, self.ventilation_speed), 400, 3000)
+
+        self._update_co2_level(new_co2_level)
+        self.co2_diff = self.co2_level - t0_co2_level
+
+    def _get_rewards(self, t1_co2_level, current_ventilation_speed, previous_ventilation_speed):
+        # Give a small penalty for changing ventilation fan speed (but, not for the 1st step in an Episode)
+        return self.reward_engine.get_rewards(t1_co2_level, current_ventilation_speed, previous_ventilation_speed,
+                                              penalize_change=self.curr_step > 1)
+
+    def _update_co2_level(self, co2_level):
+        self.previous_co2_level = np.where(self.co2_level == 0, co2_level, self.co2_level)
+        self.co2_level = co2_level
@@ -0,0 +1,48 @@
+import numpy as np
+
+# Observation space bounds of the state: fan speed (0..3), CO2 level in the air (400..3000) and CO2
+# change from the previous state. The change can span the whole CO2 range: the fan at full speed
+# lowers the level by about 200 ppm in one control interval, but the first sample after the 400 ppm
+# placeholder, or the first one after a sensor outage, can be any difference of two valid levels
+OBSERVATION_LOW = np.array([0, 400, -2600], dtype=np.float32)
+OBSERVATION_HIGH = np.array([3, 3000, 2600], dtype=np.float32)
+
+class ObservationBufferMixin:
+    """Builds the float32 observations of an environment from its state.
+
+    With reuse_observation_buffer, every observation is written to the same float32
+    array instead of a new one per step. Copy it if it has to be kept (keras-rl
+    memories keep a reference to each observation).
+
+    The observation is self.state ([fan speed, CO2 level, CO2 change]), followed by
+    the RollingFeatures at _get_observation_time() if self.rolling_features is set.
+    Vectorized environments fill _get_observation_buffer() themselves.
+    """
+    rolling_features = None
+
+    def _init_observation_buffer(self, reuse_observation_buffer):
+        self.observation_buffer = np.empty(self.observation_space.shape, dtype=np.float32) if reuse_observation_buffer else None
+
+    def _get_observation_buffer(self):
+        # The reused buffer, or a new array
+        if self.observation_buffer is None:
+            return np.empty(self.observation_space.shape, dtype=np.float32)
+        return self.observation_buffer
+
+    def _get_observation(self):
+        if self.rolling_features is not None:
+            return self._get_extended_observation(self._get_observation_time())
+        if self.observation_buffer is None:
+            return self.state.astype(np.float32)
+        self.observation_buffer[:] = self.state
+        return self.observation_buffer
+
+    def _get_extended_observation(self, now):
+        observation = self._get_observation_buffer()
+        observation[:3] = self.state
+        self.rolling_features.get(now, out=observation[3:])
+        return observation
+
+    def _get_observation_time(self):
+        # Time (seconds) the rolling features are computed at, only called with rolling features
+        raise NotImplementedError
@@ -0,0 +1,92 @@
+import bisect
+import numpy as np
+
+# Reward is looked up from the band the CO2 level falls in:
+# CO2 < 900 => 1.0, CO2 < 950 => 0.9, ... , CO2 >= 1500 => -0.6
+DEFAULT_CO2_THRESHOLDS = [900, 950, 1000, 1200, 1500]
+DEFAULT_CO2_REWARDS = [1.0, 0.9, 0.8, 0.4, -0.2, -0.6]
+
+# Penalty for energy consumption per ventilation fan speed (0..3)
+DEFAULT_VENTILATION_COSTS = [0.0, 0.2, 0.4, 0.8]
+
+# Penalty for changing ventilation fan speed between two steps
+DEFAULT_FAN_CHANGE_PENALTY = 0.1
+
+# With an outdoor temperature, the ventilation cost grows by this fraction per degree between
+# the indoor and outdoor temperature (the supply air has to be heated or cooled)
+DEFAULT_INDOOR_TEMPERATURE = 21.0
+DEFAULT_TEMPERATURE_COST_FACTOR = 0.02
+
+class RewardEngine:
+    """Table-driven reward shared by all the CO2 ventilation environments.
+
+    The reward tables are compiled once into arrays, so whole batches of
+    (CO2 level, fan speed, previous fan speed) can be scored with a single
+    searchsorted pass. Environments take the tables through the reward_config
+    registration kwarg, e.g. kwargs={'reward_config': {'fan_change_penalty': 0.2}}.
+    The ventilation cost only depends on the outdoor temperature when one is passed
+    (the simulator does so when it runs scenarios).
+    """
+
+    def __init__(self, co2_thresholds=None, co2_rewards=None, ventilation_costs=None,
+                 fan_change_penalty=DEFAULT_FAN_CHANGE_PENALTY, indoor_temperature=DEFAULT_INDOOR_TEMPERATURE,
+                 temperature_cost_factor=DEFAULT_TEMPERATURE_COST_FACTOR):
+        if co2_thresholds is None:
+            co2_thresholds = DEFAULT_CO2_THRESHOLDS
+        if co2_rewards is None:
+            co2_rewards = DEFAULT_CO2_REWARDS
+        if ventilation_costs is None:
+            ventilation_costs = DEFAULT_VENTILATION_COSTS
+
+        if len(co2_rewards) != len(co2_thresholds) + 1:
+            raise ValueError(f"Expected {len(co2_thresholds) + 1} CO2 rewards for {len(co2_thresholds)} thresholds, got {len(co2_rewards)}")
+        if any(a >= b for a, b in zip(co2_thresholds, co2_thresholds[1:])):
+            raise ValueError(f"CO2 thresholds must be strictly increasing: {co2_thresholds}")
+
+        self.co2_thresholds = np.array(co2_thresholds, dtype=np.float64)
+        self.co2_rewards = np.array(co2_rewards, dtype=np.float64)
+        self.ventilation_costs = np.array(ventilation_costs, dtype=np.float64)
+        self.fan_change_penalty = float(fan_change_penalty)
+        self.indoor_temperature = float(indoor_temperature)
+        self.temperature_cost_factor = float(temperature_cost_factor)
+
+        # Plain Python copies for the scalar path, avoids NumPy overhead for single steps
+        self._co2_thresholds = [float(x) for x in co2_thresholds]
+        self._co2_rewards = [float(x) for x in co2_rewards]
+        self._ventilation_costs = [float(x) for x in ventilation_costs]
+
+    def get_reward(self, co2_level, ventilation_speed, previous_ventilation_speed, penalize_change=True,
+                   outdoor_temperature=None):
+        reward = self._co2_rewards[bisect.bisect_right(self._co2_thresholds, co2_level)]
+
+        # Give penalty for energy consumption, higher the more the supply air has to be heated or cooled
+        ventilation_cost = self._ventilation_costs[ventilation_speed]
+        if outdoor_temperature is not None:
+            ventilation_cost *= 1.0 + self.temperature_cost_factor * abs(self.indoor_temperature - outdoor_temperature)
+        reward = reward - ventilation_cost
+
+        # Give a small penalty for changing ventilation fan speed
+        if penalize_change and ventilation_speed != previous_ventilation_speed:
+            reward = reward - self.fan_change_penalty
+
+        return reward
+
+    def get_rewards(self, co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change=True,
+                    outdoor_temperatures=None):
+        co2_levels = np.asarray(co2_levels)
+        ventilation_speeds = np.asarray(ventilation_speeds)
+        rewards = self.co2_rewards[np.searchsorted(self.co2_thresholds, co2_levels, side='right')]
+        ventilation_costs = self.ventilation_costs[ventilation_speeds]
+        if outdoor_temperatures is not None:
+            ventilation_costs = ventilation_costs * (1.0 + self.temperature_cost_factor * np.abs(self.indoor_temperature - np.asarray(outdoor_temperatures)))
+        rewards = rewards - ventilation_costs
+        changed = np.logical_and(penalize_change, ventilation_speeds != np.asarray(previous_ventilation_speeds))
+        return np.where(changed, rewards - self.fan_change_penalty, rewards)
+
+    def get_episode_rewards(self, co2_levels, ventilation_speeds):
+        # Scores whole episodes laid out along the last axis, e.g. recorded trajectories of shape (episodes, steps).
+        # As in the environments, the 1st step of an episode is not penalized for changing fan speed.
+        ventilation_speeds = np.asarray(ventilation_speeds)
+        previous_ventilation_speeds = np.roll(ventilation_speeds, 1, axis=-1)
+        penalize_change = np.arange(ventilation_speeds.shape[-1]) > 0
+        return self.get_rewards(co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change)
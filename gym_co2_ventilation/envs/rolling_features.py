@@ -0,0 +1,135 @@
+import collections
+import numpy as np
+
+ROLLING_FEATURE_NAMES = ['co2_mean', 'co2_slope', 'co2_min', 'co2_max', 'sample_age']
+
+# Observation space bounds of the features, appended to the [fan speed, CO2 level, CO2 change] bounds
+ROLLING_FEATURES_LOW = np.array([400, -100, 400, 400, 0], dtype=np.float32)
+ROLLING_FEATURES_HIGH = np.array([3000, 100, 3000, 3000, np.inf], dtype=np.float32)
+
+# Most samples a snapshot can hold, e.g. a 600 second window with a sample every 5 seconds
+ROLLING_FEATURES_MAX_SAMPLES = 128
+# State of a RollingFeatures, as returned by get_state(). The min and max deques are rebuilt from the samples.
+ROLLING_FEATURES_STATE_DTYPE = np.dtype([
+    ('nb_samples', '<i8'),
+    ('samples', '<f8', (ROLLING_FEATURES_MAX_SAMPLES, 2)),  # (timestamp, value) within the window, oldest first
+    ('sum', '<f8'),
+    ('last_time', '<f8'),                                   # NaN before the first sample
+    ('decayed_sums', '<f8', (5,)),                          # sw, sx, sv, sxx, sxv
+])
+
+class RollingFeatures:
+    """Streaming features of the CO2 sensor values, updated in constant time per sample.
+
+    - co2_mean: mean of the samples received in the last window seconds
+    - co2_slope: exponentially weighted least-squares slope of the samples, in ppm per minute.
+      Older samples count half as much every slope_halflife seconds.
+    - co2_min, co2_max: minimum and maximum of the samples in the last window seconds
+    - sample_age: seconds since the last sample
+
+    The mean keeps a running sum, min and max keep monotonic deques, and the slope keeps
+    five decayed sums relative to the time of the last sample, so update() is O(1)
+    amortized and only the samples within the window are stored. With no samples
+    yet, all features are 0.
+    """
+
+    def __init__(self, window=600.0, slope_halflife=300.0):
+        if window <= 0 or slope_halflife <= 0:
+            raise ValueError(f"window and slope_halflife must be positive, got {window} and {slope_halflife}")
+        self.window = window
+        self.slope_halflife = slope_halflife
+        self.reset()
+
+    def reset(self):
+        self._samples = collections.deque()  # (timestamp, value) within the window
+        self._sum = 0.0
+        self._min = collections.deque()      # Increasing values, the front is the minimum
+        self._max = collections.deque()      # Decreasing values, the front is the maximum
+        self._last_time = None
+        # Decayed sums of weights, x, value, x * x and x * value, where x = timestamp - last sample time
+        self._sw = self._sx = self._sv = self._sxx = self._sxv = 0.0
+
+    def update(self, value, timestamp):
+        value = float(value)
+        if self._last_time is not None:
+            dt = max(0.0, timestamp - self._last_time)
+            # Decay the sums and move their origin to the new sample
+            decay = 0.5 ** (dt / self.slope_halflife)
+            sw, sx = self._sw * decay, self._sx * decay
+            sv, sxx, sxv = self._sv * decay, self._sxx * decay, self._sxv * decay
+            self._sxx = sxx - 2 * dt * sx + dt * dt * sw
+            self._sxv = sxv - dt * sv
+            self._sx = sx - dt * sw
+            self._sw, self._sv = sw, sv
+            timestamp = max(timestamp, self._last_time)
+        self._last_time = timestamp
+        self._sw += 1.0
+        self._sv += value
+        # x is 0 for the new sample, so sx, sxx and sxv are unchanged
+
+        self._sum += value
+        self._append(timestamp, value)
+        self._expire(timestamp - self.window)
+
+    def get(self, now, out=None):
+        """Returns [co2_mean, co2_slope, co2_min, co2_max, sample_age] at time now."""
+        if out is None:
+            out = np.zeros(len(ROLLING_FEATURE_NAMES), dtype=np.float32)
+        if self._last_time is None:
+            out[:] = 0.0
+            return out
+        # The window and the slope use the sample times, samples expire when new ones arrive
+        variance = self._sw * self._sxx - self._sx * self._sx
+        slope = 0.0 if variance <= 1e-9 * max(1.0, self._sw * self._sxx) else (self._sw * self._sxv - self._sx * self._sv) / variance
+        out[0] = self._sum / len(self._samples)
+        out[1] = slope * 60.0
+        out[2] = self._min[0][1]
+        out[3] = self._max[0][1]
+        out[4] = max(0.0, now - self._last_time)
+        return out
+
+    def get_state(self, out=None):
+        """Snapshot as a ROLLING_FEATURES_STATE_DTYPE record, restored with set_state()."""
+        if len(self._samples) > ROLLING_FEATURES_MAX_SAMPLES:
+            raise ValueError(f"{len(self._samples)} samples in the window, a snapshot holds at most {ROLLING_FEATURES_MAX_SAMPLES}")
+        if out is None:
+            out = np.zeros((), dtype=ROLLING_FEATURES_STATE_DTYPE)
+        nb_samples = len(self._samples)
+        out['nb_samples'] = nb_samples
+        if nb_samples:
+            out['samples'][:nb_samples] = self._samples
+        out['sum'] = self._sum
+        out['last_time'] = np.nan if self._last_time is None else self._last_time
+        out['decayed_sums'] = (self._sw, self._sx, self._sv, self._sxx, self._sxv)
+        return out
+
+    def set_state(self, state):
+        """Restores a snapshot returned by get_state()."""
+        self.reset()
+        for timestamp, value in state['samples'][:int(state['nb_samples'])].tolist():
+            self._append(timestamp, value)
+        self._sum = float(state['sum'])
+        last_time = float(state['last_time'])
+        self._last_time = None if np.isnan(last_time) else last_time
+        self._sw, self._sx, self._sv, self._sxx, self._sxv = state['decayed_sums'].tolist()
+
+    def _append(self, timestamp, value):
+        self._samples.append((timestamp, value))
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((timestamp, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((timestamp, value))
+
+    def _expire(self, oldest_time):
+        samples = self._samples
+        while samples[0][0] <= oldest_time:
+            self._sum -= samples.popleft()[1]
+        while self._min[0][0] <= oldest_time:
+            self._min.popleft()
+        while self._max[0][0] <= oldest_time:
+            self._max.popleft()
+        if len(samples) == 1:
+            # Recompute from the only sample left so rounding errors do not accumulate
+            self._sum = samples[0][1]
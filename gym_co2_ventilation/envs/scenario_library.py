@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+import numpy as np
+
+# A scenario library is a directory with one raw little-endian file per column, each holding
+# a (scenario, step) matrix. A scenario is typically one day of exogenous inputs for the simulator.
+SCENARIO_COLUMNS = [
+    ('occupancy', '<f4'),            # Number of people in the room
+    ('outdoor_temperature', '<f4'),  # Degrees Celsius
+    ('outdoor_co2_level', '<f4'),    # ppm
+]
+SCENARIO_META_FILE = 'scenarios.json'
+
+class ScenarioLibrary:
+    """Memory-maps a scenario library read-only.
+
+    All processes that open the same library share its pages through the OS page
+    cache, so hundreds of simulator workers can sample scenarios without each
+    loading or generating them.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, SCENARIO_META_FILE)) as f:
+            meta = json.load(f)
+        self.nb_scenarios = meta['nb_scenarios']
+        self.nb_steps = meta['nb_steps']
+        self.step_seconds = meta['step_seconds']
+
+        shape = (self.nb_scenarios, self.nb_steps)
+        self.columns = {name: np.memmap(os.path.join(directory, f'{name}.bin'), dtype=dtype, mode='r', shape=shape)
+                        for name, dtype in meta['columns']}
+        self.occupancy = self.columns['occupancy']
+        self.outdoor_temperature = self.columns['outdoor_temperature']
+        self.outdoor_co2_level = self.columns['outdoor_co2_level']
+
+    def get(self, scenario_id, step):
+        """Returns (occupancy, outdoor temperature, outdoor CO2 level) of a scenario at a step."""
+        return (float(self.occupancy[scenario_id, step]), float(self.outdoor_temperature[scenario_id, step]),
+                float(self.outdoor_co2_level[scenario_id, step]))
+
+def write_scenario_library(directory, occupancy, outdoor_temperature, outdoor_co2_level, step_seconds=60.0):
+    """Writes (scenario, step) matrices of the scenario columns to a new library in directory."""
+    columns = {'occupancy': occupancy, 'outdoor_temperature': outdoor_temperature, 'outdoor_co2_level': outdoor_co2_level}
+    shape = np.shape(occupancy)
+    if len(shape) != 2 or any(np.shape(values) != shape for values in columns.values()):
+        raise ValueError(f"All columns must be (scenario, step) matrices of the same shape, got {[np.shape(v) for v in columns.values()]}")
+
+    os.makedirs(directory, exist_ok=True)
+    for name, dtype in SCENARIO_COLUMNS:
+        path = os.path.join(directory, f'{name}.bin')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        np.ascontiguousarray(columns[name], dtype=dtype).tofile(tmp_path)
+        os.replace(tmp_path, path)
+    # Written last, so a library is only opened once all its columns are complete
+    meta = {'columns': SCENARIO_COLUMNS, 'nb_scenarios': shape[0], 'nb_steps': shape[1], 'step_seconds': step_seconds}
+    with open(os.path.join(directory, SCENARIO_META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+def generate_scenarios(nb_scenarios=365, nb_steps=1440, step_seconds=60.0, max_occupancy=30.0, seed=None):
+    """Synthetic days of a gym: occupancy peaks in the morning and after work (midday on weekends),
+    outdoor temperature follows the season and the time of day, and the outdoor CO2 level rises with
+    the morning traffic. Scenario i is day i of the year, starting on a Monday at midnight.
+    Returns a dict of column name => (scenario, step) array.
+    """
+    rng = np.random.RandomState(seed)
+    hours = np.arange(nb_steps) * step_seconds / 3600.0 % 24.0
+    days = np.arange(nb_scenarios)[:, np.newaxis]
+
+    def peak(center, width):
+        return np.exp(-0.5 * ((hours - center) / width) ** 2)
+
+    # Fraction of max_occupancy present, the gym is open from 6 to 22
+    weekday = 0.6 * peak(7.5, 1.0) + 0.3 * peak(12.0, 1.0) + 1.0 * peak(18.0, 1.5)
+    weekend = 0.7 * peak(10.5, 2.0) + 0.5 * peak(16.0, 2.0)
+    is_open = (hours >= 6.0) & (hours < 22.0)
+    profile = np.where(days % 7 < 5, weekday, weekend) * is_open
+    busyness = rng.uniform(0.5, 1.0, size=(nb_scenarios, 1))
+    occupancy = rng.poisson(max_occupancy * busyness * profile).astype(np.float32)
+
+    # Cold winters and mild summers, coldest around 5 in the morning, and weather drifting during the day
+    seasonal = 6.0 - 10.0 * np.cos(2 * np.pi * (days - 15) / 365.0)
+    diurnal = rng.uniform(2.0, 6.0, size=(nb_scenarios, 1)) * -np.cos(2 * np.pi * (hours - 5.0) / 24.0)
+    weather = np.cumsum(rng.normal(0.0, 0.05, size=(nb_scenarios, nb_steps)), axis=1)
+    outdoor_temperature = (seasonal + diurnal + weather).astype(np.float32)
+
+    outdoor_co2_level = (415.0 + 20.0 * peak(8.0, 1.5) + 10.0 * peak(17.0, 2.0)
+                         + rng.normal(0.0, 2.0, size=(nb_scenarios, nb_steps))).astype(np.float32)
+
+    return {'occupancy': occupancy, 'outdoor_temperature': outdoor_temperature, 'outdoor_co2_level': outdoor_co2_level}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic scenario library for the CO2 ventilation simulator")
+    parser.add_argument('directory', help='Output directory')
+    parser.add_argument('--scenarios', type=int, default=365, help='Number of scenarios (days)')
+    parser.add_argument('--steps', type=int, default=1440, help='Steps per scenario')
+    parser.add_argument('--step-seconds', type=float, default=60.0, help='Seconds per step')
+    parser.add_argument('--max-occupancy', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    scenarios = generate_scenarios(args.scenarios, args.steps, args.step_seconds, args.max_occupancy, args.seed)
+    write_scenario_library(args.directory, step_seconds=args.step_seconds, **scenarios)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import collections
+import json
+import logging
+import threading
+import time
+import numpy as np
+import requests
+
+class SensorDataConsumer:
+    """Prefetches sensor data messages from a Service Bus subscription on a background thread.
+
+    Received messages are parsed into (sensor_id, value, receive_time) tuples and
+    kept in a bounded buffer (the oldest are dropped if nobody reads them), and the
+    latest value of every sensor is cached. The backlog that built up while nobody was
+    listening is drained by the same thread, so start() returns immediately.
+
+    Messages are received in receive-and-delete mode (peek_lock=False), one HTTP call
+    per message: a sensor reading lost in a crash is superseded by the next one. With
+    peek_lock=True every message is deleted once it has been buffered, which costs a
+    second call per message (the legacy Service Bus SDK cannot delete in batches).
+    """
+
+    def __init__(self, bus_service, topic_name='sensordata', subscription_name='test',
+                 buffer_size=1024, peek_lock=False, receive_timeout=5, metrics=None):
+        self.logger = logging.getLogger("Logger")
+        self.bus_service = bus_service
+        self.topic_name = topic_name
+        self.subscription_name = subscription_name
+        self.peek_lock = peek_lock
+        self.receive_timeout = receive_timeout
+        self.metrics = metrics
+
+        # sensor_id => (value, receive_time)
+        self.latest = {}
+        self.nb_received = 0
+        self.nb_dropped = 0
+        self.nb_invalid = 0
+        self.nb_timeouts = 0
+
+        self._buffer = collections.deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._listeners = []
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='SensorDataConsumer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_latest(self, sensor_id):
+        """Returns (value, receive_time) of the latest message from sensor_id, or None. Never blocks."""
+        return self.latest.get(sensor_id)
+
+    def add_listener(self, callback):
+        """Calls callback() on the consumer thread after every sensor value that has been stored."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        self._listeners.remove(callback)
+
+    def has_messages(self):
+        """True if get_messages() would return without waiting."""
+        return len(self._buffer) > 0
+
+    def get_messages(self, timeout):
+        """Returns all buffered messages, waiting up to timeout seconds if there are none yet."""
+        with self._condition:
+            if not self._buffer:
+                self._condition.wait_for(lambda: len(self._buffer) > 0, timeout)
+            messages = list(self._buffer)
+            self._buffer.clear()
+        return messages
+
+    def _run(self):
+        while self._running:
+            try:
+                msg = self.bus_service.receive_subscription_message(
+                    self.topic_name, self.subscription_name, peek_lock=self.peek_lock, timeout=self.receive_timeout)
+            except requests.exceptions.ReadTimeout:
+                self.nb_timeouts += 1
+                msg = None
+            except Exception:
+                self.logger.exception("Exception from ServiceBusService.receive_subscription_message")
+                time.sleep(1.0)
+                msg = None
+
+            if msg is not None and msg.body is not None:
+                self._handle_message(msg)
+
+    def _handle_message(self, msg):
+        receive_time = time.time()
+        if self.metrics is not None:
+            start = time.perf_counter()
+        try:
+            sensordata = json.loads(msg.body)
+            sensor_id = sensordata['Id']
+            sensor_value = sensordata['Value']
+        except (ValueError, KeyError, TypeError):
+            self.logger.error("Invalid sensor data message: %r", msg.body)
+            self.nb_invalid += 1
+        else:
+            self._store_sensor_value(sensor_id, sensor_value, receive_time)
+            if self.metrics is not None:
+                self.metrics.observe_time('process_sensor_data', time.perf_counter() - start)
+            for callback in list(self._listeners):
+                try:
+                    callback()
+                except Exception:
+                    self.logger.exception("Exception from sensor data listener")
+
+        if self.peek_lock:
+            try:
+                msg.delete()
+            except Exception:
+                self.logger.exception("Exception when deleting sensor data message")
+
+    def _store_sensor_value(self, sensor_id, sensor_value, receive_time):
+        with self._condition:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.nb_dropped += 1
+            self._buffer.append((sensor_id, sensor_value, receive_time))
+            self.latest[sensor_id] = (sensor_value, receive_time)
+            self.nb_received += 1
+            self._condition.notify_all()
+
+class SensorDataDemultiplexer(SensorDataConsumer):
+    """SensorDataConsumer for many sensors on one subscription, e.g. one CO2 sensor per zone.
+
+    Instead of buffering the messages, the latest value, receive time and number of
+    samples of sensor_ids[i] are written to values[i], receive_times[i] and
+    nb_samples[i]. Messages from other sensors are counted in nb_unknown and ignored.
+    """
+
+    def __init__(self, bus_service, sensor_ids, topic_name='sensordata', subscription_name='test', **kwargs):
+        super().__init__(bus_service, topic_name, subscription_name, **kwargs)
+        self.sensor_ids = list(sensor_ids)
+        self.zone_index = {sensor_id: i for i, sensor_id in enumerate(self.sensor_ids)}
+        self.values = np.full(len(self.sensor_ids), np.nan)
+        self.receive_times = np.full(len(self.sensor_ids), np.nan)
+        self.nb_samples = np.zeros(len(self.sensor_ids), dtype=np.int64)
+        self.nb_unknown = 0
+
+    def get_latest(self, sensor_id):
+        i = self.zone_index.get(sensor_id)
+        if i is None or self.nb_samples[i] == 0:
+            return None
+        return self.values[i], self.receive_times[i]
+
+    def snapshot(self):
+        """Returns copies of (values, receive_times, nb_samples). Never blocks on the bus."""
+        with self._condition:
+            return self.values.copy(), self.receive_times.copy(), self.nb_samples.copy()
+
+    def wait_for_samples(self, nb_samples, timeout):
+        """Waits up to timeout seconds until any sensor has more than nb_samples[i] samples, then returns snapshot()."""
+        with self._condition:
+            self._condition.wait_for(lambda: np.any(self.nb_samples > nb_samples), timeout)
+            return self.values.copy(), self.receive_times.copy(), self.nb_samples.copy()
+
+    def _store_sensor_value(self, sensor_id, sensor_value, receive_time):
+        i = self.zone_index.get(sensor_id)
+        if i is None:
+            self.nb_unknown += 1
+            return
+        with self._condition:
+            self.values[i] = sensor_value
+            self.receive_times[i] = receive_time
+            self.nb_samples[i] += 1
+            self.nb_received += 1
+            self._condition.notify_all()
@@ -0,0 +1,55 @@
+import json
+import os
+import numpy as np
+
+# A sensor trace is a directory with one raw little-endian file per column, one row per CO2 sensor message.
+# fan_speed is the fan speed (0..3) commanded when the message arrived, -1 if not known yet.
+SENSOR_TRACE_COLUMNS = [
+    ('timestamp', '<f8'),
+    ('co2_level', '<f4'),
+    ('fan_speed', '<i1'),
+]
+SENSOR_TRACE_META_FILE = 'trace.json'
+
+class SensorTraceWriter:
+    """Appends rows to a columnar sensor trace, which can be replayed by CO2VentilationReplayEnv.
+
+    Attach it to the production environment with:
+
+        env.unwrapped.trace_writer = SensorTraceWriter('co2_ventilation_trace')
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, SENSOR_TRACE_META_FILE)
+        if not os.path.exists(meta_path):
+            with open(meta_path, 'w') as f:
+                json.dump({'columns': SENSOR_TRACE_COLUMNS}, f)
+
+        self._dtypes = [np.dtype(dtype) for name, dtype in SENSOR_TRACE_COLUMNS]
+        self._files = [open(os.path.join(directory, f'{name}.bin'), 'ab') for name, dtype in SENSOR_TRACE_COLUMNS]
+
+    def append(self, timestamp, co2_level, fan_speed):
+        for f, dtype, value in zip(self._files, self._dtypes, (timestamp, co2_level, fan_speed)):
+            f.write(dtype.type(value).tobytes())
+
+    def flush(self):
+        for f in self._files:
+            f.flush()
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+def open_sensor_trace(directory):
+    """Memory-maps all columns of a sensor trace read-only. Returns a dict of column name => array."""
+    with open(os.path.join(directory, SENSOR_TRACE_META_FILE)) as f:
+        columns = json.load(f)['columns']
+
+    # Columns are written one after the other, so a trace that is still being written may have a partial last row
+    paths = {name: os.path.join(directory, f'{name}.bin') for name, dtype in columns}
+    nb_rows = min(os.path.getsize(paths[name]) // np.dtype(dtype).itemsize for name, dtype in columns)
+    if nb_rows == 0:
+        return {name: np.zeros(0, dtype=dtype) for name, dtype in columns}
+    return {name: np.memmap(paths[name], dtype=dtype, mode='r', shape=(nb_rows,)) for name, dtype in columns}
@@ -0,0 +1,174 @@
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+def _worker(remote, parent_remote, env_id, env_indices, seed):
+    # Imported here so the environments are registered in spawned processes as well
+    import gym
+    import gym_co2_ventilation
+
+    parent_remote.close()
+    envs = [gym.make(env_id) for _ in env_indices]
+    if seed is not None:
+        for i, env in zip(env_indices, envs):
+            env.seed(seed + i)
+    batch_shape = _get_batch_shape(envs[0])
+    remote.send((envs[0].observation_space, envs[0].action_space, batch_shape))
+
+    # Attach to the shared buffers allocated by the parent
+    buffers = {}
+    handles = []
+    for name, (shm_name, shape, dtype) in remote.recv().items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        handles.append(shm)
+        buffers[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    observations, actions, rewards, dones = buffers['observations'], buffers['actions'], buffers['rewards'], buffers['dones']
+
+    try:
+        while True:
+            cmd = remote.recv()
+            if cmd == 'step':
+                infos = []
+                for i, env in zip(env_indices, envs):
+                    observation, reward, done, info = env.step(_to_env_action(actions[i]))
+                    # Vectorized environments reset their rooms by themselves
+                    if not batch_shape and done:
+                        info['terminal_observation'] = observation
+                        observation = env.reset()
+                    observations[i] = observation
+                    rewards[i] = reward
+                    dones[i] = done
+                    infos.append(info)
+                remote.send(infos)
+            elif cmd == 'reset':
+                for i, env in zip(env_indices, envs):
+                    observations[i] = env.reset()
+                remote.send(None)
+            elif cmd == 'close':
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for env in envs:
+            env.close()
+        del observations, actions, rewards, dones, buffers
+        for shm in handles:
+            shm.close()
+        remote.close()
+
+def _get_batch_shape(env):
+    # Vectorized environments (with num_envs) return one reward and done flag per room
+    num_envs = getattr(env.unwrapped, 'num_envs', None)
+    return () if num_envs is None else (num_envs,)
+
+def _to_env_action(action):
+    # Discrete spaces take a Python int, MultiDiscrete spaces an array (copied out of the shared buffer)
+    return int(action) if action.ndim == 0 else action.copy()
+
+class SubprocVectorEnv:
+    """Runs num_envs copies of a registered environment in a pool of worker processes.
+
+    Observations, actions, rewards and done flags are exchanged through shared
+    memory buffers, only a short command and the info dicts go through the pipes.
+    Each worker steps num_envs / num_workers environments, and environments that
+    are done are reset automatically (the last observation is in
+    info['terminal_observation']). Uses multiprocessing.shared_memory (Python 3.8+).
+
+    The environments can also be vectorized (e.g. CO2VentilationVectorSimulator-v0),
+    then rewards and dones have one row of batch_shape per environment, and the
+    rooms are reset by the environments themselves.
+    """
+
+    def __init__(self, env_id, num_envs, num_workers=None, start_method=None, seed=None):
+        self.env_id = env_id
+        self.num_envs = num_envs
+        if num_workers is None:
+            num_workers = min(num_envs, mp.cpu_count())
+        self.num_workers = num_workers
+
+        # Start the resource tracker before the workers, so that forked workers share it with this process.
+        # Otherwise each worker starts its own, which unlinks the shared buffers when the worker exits.
+        resource_tracker.ensure_running()
+
+        ctx = mp.get_context(start_method)
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for worker_indices, work_remote, remote in zip(np.array_split(np.arange(num_envs), num_workers), self.work_remotes, self.remotes):
+            process = ctx.Process(target=_worker, args=(work_remote, remote, env_id, worker_indices.tolist(), seed), daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.observation_space, self.action_space, self.batch_shape = self.remotes[0].recv()
+        for remote in self.remotes[1:]:
+            remote.recv()
+
+        # Allocate the shared buffers and hand them to the workers
+        layouts = {
+            'observations': ((num_envs,) + self.observation_space.shape, self.observation_space.dtype),
+            'actions': ((num_envs,) + self.action_space.shape, np.int64),
+            'rewards': ((num_envs,) + self.batch_shape, np.float64),
+            'dones': ((num_envs,) + self.batch_shape, np.bool_),
+        }
+        self._shared_memory = []
+        buffers = {}
+        specs = {}
+        for name, (shape, dtype) in layouts.items():
+            dtype = np.dtype(dtype)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            self._shared_memory.append(shm)
+            buffers[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            specs[name] = (shm.name, shape, dtype.str)
+        for remote in self.remotes:
+            remote.send(specs)
+        self._observations = buffers['observations']
+        self._actions = buffers['actions']
+        self._rewards = buffers['rewards']
+        self._dones = buffers['dones']
+
+        self.waiting = False
+        self.closed = False
+
+    def reset(self):
+        for remote in self.remotes:
+            remote.send('reset')
+        for remote in self.remotes:
+            remote.recv()
+        return self._observations.copy()
+
+    def step_async(self, actions):
+        self._actions[:] = actions
+        for remote in self.remotes:
+            remote.send('step')
+        self.waiting = True
+
+    def step_wait(self):
+        infos = []
+        for remote in self.remotes:
+            infos.extend(remote.recv())
+        self.waiting = False
+        return self._observations.copy(), self._rewards.copy(), self._dones.copy(), infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send('close')
+        for process in self.processes:
+            process.join()
+        self._observations = self._actions = self._rewards = self._dones = None
+        for shm in self._shared_memory:
+            shm.close()
+            shm.unlink()
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, 'closed', True):
+            self.close()
@@ -0,0 +1,106 @@
+import json
+import logging
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+def create_session(pool_maxsize=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+class VentilationFanClient:
+    """Sends fan speed commands to the ventilation REST service over a persistent session.
+
+    Connections are kept alive and reused between commands, every call has a
+    connect/read timeout, and failed calls (connection errors, timeouts and 5xx
+    responses) are retried with bounded exponential backoff. A command for the fan
+    speed that was last confirmed by the service is skipped. Clients for several
+    devices can share one session (and its connection pool) by passing session.
+    """
+
+    def __init__(self, url, api_key, device_id="302", connect_timeout=3.05, read_timeout=10.0,
+                 max_retries=2, backoff_factor=0.5, max_backoff=5.0, pool_maxsize=4, session=None):
+        self.logger = logging.getLogger("Logger")
+        self.url = url
+        self.api_key = api_key
+        self.device_id = device_id
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+        # A session passed in is owned (and closed) by the caller
+        self.owns_session = session is None
+        self.session = create_session(pool_maxsize) if session is None else session
+
+        # Fan speed (0..3) last confirmed by the REST service, None if unknown
+        self.confirmed_fan_speed = None
+
+        # Latency of the last command in seconds (all attempts included, 0.0 if skipped)
+        self.last_latency = None
+        self.nb_commands = 0
+        self.nb_skipped = 0
+        self.nb_failures = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def set_fan_speed(self, ventilation_speed):
+        """Returns True if the service confirmed the fan speed (or it was already confirmed)."""
+        if ventilation_speed == self.confirmed_fan_speed:
+            self.logger.info("Fan speed %d already set, skipping REST call", ventilation_speed + 1)
+            self.last_latency = 0.0
+            self.nb_skipped += 1
+            return True
+
+        data = json.dumps({
+            "deviceGroupId": "Ventilation",
+            "deviceId": self.device_id,
+            "capabilityId": "VentilationFan",
+            "commandId": f"FanSpeed{ventilation_speed + 1}",
+            "parameters": ""})
+
+        start = time.perf_counter()
+        confirmed = False
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(min(self.max_backoff, self.backoff_factor * 2 ** (attempt - 1)))
+            try:
+                r = self.session.post(self.url, params={'code': self.api_key}, data=data, timeout=self.timeout)
+                if r.status_code == 200:
+                    confirmed = True
+                    break
+                self.logger.error("REST call to change ventilation speed failed: %s %s", r.status_code, r.reason)
+                if r.status_code < 500:
+                    break
+            except requests.exceptions.RequestException:
+                self.logger.exception("Exception from REST call to change ventilation fan speed")
+
+        self.last_latency = time.perf_counter() - start
+        self.nb_commands += 1
+        self.total_latency += self.last_latency
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self.logger.info("REST call to change ventilation fan speed took %.3f s", self.last_latency)
+
+        if confirmed:
+            self.confirmed_fan_speed = ventilation_speed
+        else:
+            # The fan may or may not have changed speed, so always send the next command
+            self.confirmed_fan_speed = None
+            self.nb_failures += 1
+        return confirmed
+
+    def get_latency_stats(self):
+        return {
+            'commands': self.nb_commands,
+            'skipped': self.nb_skipped,
+            'failures': self.nb_failures,
+            'mean_latency': self.total_latency / self.nb_commands if self.nb_commands > 0 else 0.0,
+            'max_latency': self.max_latency,
+        }
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
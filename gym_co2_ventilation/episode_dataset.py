@@ -0,0 +1,125 @@
+import glob
+import os
+import time
+import numpy as np
+
+# An episode dataset is a directory of chunk files (.npz), each holding up to chunk_size transitions
+# with one typed array per column. The observation columns have one row of observation_shape per transition.
+EPISODE_DATASET_COLUMNS = [
+    ('episode', '<i4'),
+    ('step', '<i4'),
+    ('observation', '<f4'),
+    ('action', '<i1'),
+    ('reward', '<f4'),
+    ('next_observation', '<f4'),
+    ('done', '?'),
+    ('timestamp', '<f8'),
+]
+EPISODE_DATASET_CHUNK_PATTERN = 'chunk_*.npz'
+
+class EpisodeDatasetWriter:
+    """Buffers transitions in preallocated column arrays and writes them to the dataset one chunk at a time.
+
+    Attach it to an environment with:
+
+        env.unwrapped.dataset_writer = EpisodeDatasetWriter('co2_ventilation_dataset')
+
+    and close() it when done, which writes the last, partial chunk. Chunks are
+    numbered after the ones already in the directory, so a dataset can be extended
+    by later runs. Read it back with iterate_minibatches().
+    """
+
+    def __init__(self, directory, chunk_size=65536, observation_shape=(3,)):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+
+        self._columns = {}
+        for name, dtype in EPISODE_DATASET_COLUMNS:
+            shape = (chunk_size,) + tuple(observation_shape) if name.endswith('observation') else (chunk_size,)
+            self._columns[name] = np.zeros(shape, dtype=dtype)
+        self._nb_rows = 0
+        self._next_chunk = len(list_dataset_chunks(directory))
+        self.nb_chunks_written = 0
+
+    def append(self, episode, step, observation, action, reward, next_observation, done, timestamp=None):
+        row = self._nb_rows
+        columns = self._columns
+        columns['episode'][row] = episode
+        columns['step'][row] = step
+        columns['observation'][row] = observation
+        columns['action'][row] = action
+        columns['reward'][row] = reward
+        columns['next_observation'][row] = next_observation
+        columns['done'][row] = done
+        columns['timestamp'][row] = time.time() if timestamp is None else timestamp
+        self._nb_rows = row + 1
+        if self._nb_rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered transitions as a new chunk."""
+        if self._nb_rows == 0:
+            return
+        path = os.path.join(self.directory, f'chunk_{self._next_chunk:06d}.npz')
+        # Written to a temporary file and renamed, so readers never see a partial chunk
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **{name: column[:self._nb_rows] for name, column in self._columns.items()})
+        os.replace(tmp_path, path)
+        self._next_chunk += 1
+        self.nb_chunks_written += 1
+        self._nb_rows = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def list_dataset_chunks(directories):
+    """Chunk files of one or more dataset directories, in the order they were written."""
+    if isinstance(directories, str):
+        directories = [directories]
+    return [path for directory in directories for path in sorted(glob.glob(os.path.join(directory, EPISODE_DATASET_CHUNK_PATTERN)))]
+
+def read_dataset_chunk(path, columns=None):
+    """Returns a dict of column name => array for one chunk file."""
+    with np.load(path) as f:
+        return {name: f[name] for name in (columns or f.files)}
+
+def iterate_minibatches(directories, batch_size, columns=None, shuffle=False, seed=None, drop_last=True):
+    """Yields dicts of column name => array of batch_size transitions from one or more dataset directories.
+
+    Only one chunk is in memory at a time, and batches continue across chunk
+    boundaries. With shuffle, the chunks are visited in random order and the
+    transitions of each chunk are shuffled. The last incomplete batch is dropped
+    unless drop_last is False.
+    """
+    paths = list_dataset_chunks(directories)
+    columns = columns or [name for name, dtype in EPISODE_DATASET_COLUMNS]
+    random = np.random.RandomState(seed)
+    if shuffle:
+        random.shuffle(paths)
+
+    # Transitions left over from the previous chunk, fewer than batch_size
+    remainder = None
+    for path in paths:
+        chunk = read_dataset_chunk(path, columns)
+        if shuffle:
+            order = random.permutation(len(chunk[columns[0]]))
+            chunk = {name: values[order] for name, values in chunk.items()}
+        if remainder is not None:
+            chunk = {name: np.concatenate((remainder[name], values)) for name, values in chunk.items()}
+
+        nb_rows = len(chunk[columns[0]])
+        nb_full = nb_rows - nb_rows % batch_size
+        for start in range(0, nb_full, batch_size):
+            yield {name: values[start:start + batch_size] for name, values in chunk.items()}
+        remainder = {name: values[nb_full:] for name, values in chunk.items()} if nb_full < nb_rows else None
+
+    if remainder is not None and not drop_last:
+        yield remainder
@@ -0,0 +1,84 @@
+import json
+import os
+import numpy as np
+from rl.memory import SequentialMemory
+
+class MemmapRingBuffer:
+    """Drop-in for rl.memory.RingBuffer that stores its items in a memory-mapped array.
+
+    The number of items appended is kept in a counter shared by all buffers of a
+    MemmapSequentialMemory, so the buffers stay consistent if the process dies in
+    the middle of an append.
+    """
+
+    def __init__(self, path, maxlen, counter, shape=(), dtype=np.float32):
+        self.maxlen = maxlen
+        self.counter = counter
+        mode = 'r+' if os.path.exists(path) else 'w+'
+        self.data = np.memmap(path, dtype=dtype, mode=mode, shape=(maxlen,) + tuple(shape))
+
+    def __len__(self):
+        return min(int(self.counter[0]), self.maxlen)
+
+    def __getitem__(self, idx):
+        length = len(self)
+        if idx < 0 or idx >= length:
+            raise KeyError()
+        start = (int(self.counter[0]) - length) % self.maxlen
+        item = self.data[(start + idx) % self.maxlen]
+        return item.copy() if item.ndim > 0 else item.item()
+
+    def append(self, v):
+        # Written at the next free slot, becomes visible when the counter is incremented
+        self.data[int(self.counter[0]) % self.maxlen] = v
+
+    def flush(self):
+        self.data.flush()
+
+class MemmapSequentialMemory(SequentialMemory):
+    """keras-rl SequentialMemory stored in memory-mapped files in a directory.
+
+    Every append only writes the new transition, and an existing directory is
+    reopened without reading it into memory, so the memory survives process
+    restarts without pickling it. Can be passed as memory to DQNAgent.
+    """
+
+    def __init__(self, directory, limit, observation_shape, observation_dtype=np.float32, **kwargs):
+        super().__init__(limit, **kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        meta = {'limit': limit, 'observation_shape': list(observation_shape), 'observation_dtype': np.dtype(observation_dtype).str}
+        meta_path = os.path.join(directory, 'memory.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                existing_meta = json.load(f)
+            if existing_meta != meta:
+                raise ValueError(f"Memory in {directory} was created with {existing_meta}, not {meta}")
+        else:
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+
+        counter_path = os.path.join(directory, 'counter.bin')
+        self.counter = np.memmap(counter_path, dtype=np.int64, mode='r+' if os.path.exists(counter_path) else 'w+', shape=(1,))
+        self.actions = MemmapRingBuffer(os.path.join(directory, 'actions.bin'), limit, self.counter, dtype=np.int32)
+        self.rewards = MemmapRingBuffer(os.path.join(directory, 'rewards.bin'), limit, self.counter, dtype=np.float32)
+        self.terminals = MemmapRingBuffer(os.path.join(directory, 'terminals.bin'), limit, self.counter, dtype=np.bool_)
+        self.observations = MemmapRingBuffer(os.path.join(directory, 'observations.bin'), limit, self.counter,
+                                             shape=observation_shape, dtype=observation_dtype)
+
+    def append(self, observation, action, reward, terminal, training=True):
+        super().append(observation, action, reward, terminal, training=training)
+        if training:
+            # Commit the transition once all the buffers have been written
+            self.counter[0] += 1
+
+    def flush(self):
+        for buffer in (self.actions, self.rewards, self.terminals, self.observations):
+            buffer.flush()
+        self.counter.flush()
+
+    def get_config(self):
+        config = super().get_config()
+        config['directory'] = self.directory
+        return config
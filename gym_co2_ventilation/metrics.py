@@ -0,0 +1,151 @@
+import bisect
+import http.server
+import os
+import threading
+
+# Upper bounds of the reward histogram buckets (the default rewards are between -1.5 and 1.0)
+DEFAULT_REWARD_BUCKETS = [-1.0, -0.5, 0.0, 0.25, 0.5, 0.75, 1.0]
+
+class MetricsRegistry:
+    """In-process registry of counters, timers and histograms.
+
+    Attach it to an environment to time every step phase and count sensor messages,
+    timeouts and REST failures:
+
+        metrics = MetricsRegistry()
+        env = CO2VentilationProductionEnv(metrics=metrics)
+        metrics.start_http_server(9108)        # or metrics.start_text_file_writer('co2_ventilation.prom')
+
+    Without a registry (metrics=None, the default) nothing is timed or counted.
+    Counters kept elsewhere (e.g. by the fan client) are read at exposition time
+    from the functions added with add_collector(). to_text() renders everything in
+    the Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix='co2_ventilation', reward_buckets=DEFAULT_REWARD_BUCKETS):
+        self.prefix = prefix
+        self.reward_buckets = list(reward_buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}      # name => [count, sum, max]
+        self._histograms = {}  # name => [bucket counts..., count of values above the last bucket, sum]
+        self._collectors = []
+        self._server = None
+        self._writer_thread = None
+        self._writer_stop = threading.Event()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe_time(self, name, seconds):
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    def observe_reward(self, reward, name='reward'):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [0] * (len(self.reward_buckets) + 1) + [0.0]
+            histogram[bisect.bisect_left(self.reward_buckets, reward)] += 1
+            histogram[-1] += reward
+
+    def add_collector(self, collector):
+        """collector() returns a dict of counter name => value, read whenever the metrics are exported."""
+        self._collectors.append(collector)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'counters': dict(self._counters),
+                'timers': {name: {'count': count, 'sum': total, 'max': maximum}
+                           for name, (count, total, maximum) in self._timers.items()},
+                'histograms': {name: {'buckets': self.reward_buckets, 'counts': histogram[:-1], 'sum': histogram[-1]}
+                               for name, histogram in self._histograms.items()},
+            }
+        for collector in self._collectors:
+            snapshot['counters'].update(collector())
+        return snapshot
+
+    def to_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            lines.append(f"{self.prefix}_{name} {value}")
+        for name, timer in sorted(snapshot['timers'].items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count {timer['count']}")
+            lines.append(f"{metric}_sum {timer['sum']}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.append(f"{metric}_max {timer['max']}")
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            metric = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bucket, count in zip(histogram['buckets'] + ['+Inf'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bucket}"}} {cumulative}')
+            lines.append(f"{metric}_count {cumulative}")
+            lines.append(f"{metric}_sum {histogram['sum']}")
+        return "\n".join(lines) + "\n"
+
+    def write_text_file(self, path):
+        # Written to a temporary file and renamed, so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_text())
+        os.replace(tmp_path, path)
+
+    def start_text_file_writer(self, path, interval=15.0):
+        """Rewrites path every interval seconds on a background thread (e.g. for the node_exporter textfile collector)."""
+        def run():
+            while not self._writer_stop.wait(interval):
+                self.write_text_file(path)
+            self.write_text_file(path)
+
+        self._writer_stop.clear()
+        self._writer_thread = threading.Thread(target=run, name='MetricsTextFileWriter', daemon=True)
+        self._writer_thread.start()
+
+    def start_http_server(self, port=0, host='127.0.0.1'):
+        """Serves the metrics on http://host:port/metrics, returns the port."""
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.to_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='MetricsHttpServer', daemon=True).start()
+        return self._server.server_port
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._writer_thread is not None:
+            self._writer_stop.set()
+            self._writer_thread.join()
+            self._writer_thread = None
@@ -0,0 +1,122 @@
+import collections
+import numpy as np
+from gym_co2_ventilation.envs.co2_model import MassBalanceCO2Model
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+
+class MPCPolicy:
+    """Model-predictive controller that plans with the simulator dynamics and reward.
+
+    For every decision the tree of fan speed sequences over the next horizon steps is
+    rolled out with MassBalanceCO2Model and scored with RewardEngine (fan change
+    penalty included), and the first action of the best sequence is taken. The tree
+    is expanded one level at a time over flat arrays, so sequences with a common
+    prefix share its rollout and a level costs a few array operations for all rooms
+    and all nodes together. After each level, nodes that cannot catch up with the
+    guaranteed return of the best node of their room are pruned (exact), and with
+    beam_width only the best nodes of each room are kept (approximate).
+
+    Observations are [fan speed, CO2 level, CO2 change] rows as returned by all the
+    environments. select_action() drives the single-room environments, and
+    select_actions() the vectorized and multi-zone ones. select_action() caches
+    decisions by (fan speed, CO2 level rounded to cache_resolution ppm); set
+    cache_size=0 to turn the cache off.
+    """
+
+    def __init__(self, horizon=4, co2_model_config=None, reward_config=None, discount=1.0, beam_width=None,
+                 penalize_first_change=True, cache_size=4096, cache_resolution=1.0):
+        if horizon < 1:
+            raise ValueError(f"horizon must be at least 1, got {horizon}")
+        self.horizon = horizon
+        self.co2_model = MassBalanceCO2Model(**(co2_model_config or {}))
+        self.reward_engine = RewardEngine(**(reward_config or {}))
+        self.discount = discount
+        self.beam_width = beam_width
+        self.penalize_first_change = penalize_first_change
+        self.nb_actions = len(self.co2_model.fan_airflow)
+
+        # Bounds of the reward of a single step, used to prune nodes
+        costs = self.reward_engine.ventilation_costs[:self.nb_actions]
+        self._max_step_reward = self.reward_engine.co2_rewards.max() - costs.min()
+        self._min_step_reward = self.reward_engine.co2_rewards.min() - costs.max() - self.reward_engine.fan_change_penalty
+        # Discounted number of steps left after each level
+        weights = discount ** np.arange(horizon)
+        self._remaining_weight = np.append(np.cumsum(weights[::-1])[::-1][1:], 0.0)
+
+        self.cache_size = cache_size
+        self.cache_resolution = cache_resolution
+        self._cache = collections.OrderedDict()
+        self.nb_cache_hits = 0
+        self.nb_nodes_evaluated = 0
+
+    def select_action(self, observation):
+        ventilation_speed, co2_level = int(observation[0]), float(observation[1])
+        key = None
+        if self.cache_size > 0:
+            key = (ventilation_speed, round(co2_level / self.cache_resolution))
+            action = self._cache.get(key)
+            if action is not None:
+                self._cache.move_to_end(key)
+                self.nb_cache_hits += 1
+                return action
+
+        action = int(self._plan(np.array([co2_level]), np.array([ventilation_speed]))[0])
+        if key is not None:
+            self._cache[key] = action
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return action
+
+    def select_actions(self, observations):
+        observations = np.asarray(observations)
+        return self._plan(observations[:, 1].astype(np.float64), observations[:, 0].astype(np.int64))
+
+    def _plan(self, co2_levels, ventilation_speeds):
+        nb_rooms = len(co2_levels)
+        # One entry per node of the tree: room, CO2 level, fan speed, return so far and first action
+        rooms = np.arange(nb_rooms)
+        first_actions = np.zeros(nb_rooms, dtype=np.int64)
+        returns = np.zeros(nb_rooms)
+        actions = np.arange(self.nb_actions)
+
+        for depth in range(self.horizon):
+            nb_nodes = len(rooms)
+            rooms = np.repeat(rooms, self.nb_actions)
+            previous_speeds = np.repeat(ventilation_speeds, self.nb_actions)
+            ventilation_speeds = np.tile(actions, nb_nodes)
+            first_actions = ventilation_speeds if depth == 0 else np.repeat(first_actions, self.nb_actions)
+
+            co2_levels = np.clip(self.co2_model.step(np.repeat(co2_levels, self.nb_actions), ventilation_speeds), 400, 3000)
+            rewards = self.reward_engine.get_rewards(co2_levels, ventilation_speeds, previous_speeds,
+                                                     penalize_change=depth > 0 or self.penalize_first_change)
+            returns = np.repeat(returns, self.nb_actions) + self.discount ** depth * rewards
+            self.nb_nodes_evaluated += len(rooms)
+
+            if depth < self.horizon - 1:
+                keep = self._prune(rooms, returns, self._remaining_weight[depth], nb_rooms)
+                rooms, co2_levels, ventilation_speeds = rooms[keep], co2_levels[keep], ventilation_speeds[keep]
+                returns, first_actions = returns[keep], first_actions[keep]
+
+        # First action of the best sequence of each room
+        best = np.full(nb_rooms, -np.inf)
+        np.maximum.at(best, rooms, returns)
+        is_best = returns == best[rooms]
+        selected = np.zeros(nb_rooms, dtype=np.int64)
+        # The last node wins, so write in reverse to pick the lowest fan speed on ties
+        selected[rooms[is_best][::-1]] = first_actions[is_best][::-1]
+        return selected
+
+    def _prune(self, rooms, returns, remaining_weight, nb_rooms):
+        # A node is kept if its best possible return can reach the worst possible return of the best node
+        guaranteed = np.full(nb_rooms, -np.inf)
+        np.maximum.at(guaranteed, rooms, returns + remaining_weight * self._min_step_reward)
+        keep = returns + remaining_weight * self._max_step_reward >= guaranteed[rooms]
+
+        if self.beam_width is not None:
+            # Rank the nodes within each room by return, best first
+            order = np.lexsort((-returns, rooms))
+            sorted_rooms = rooms[order]
+            group_start = np.searchsorted(sorted_rooms, sorted_rooms, side='left')
+            rank = np.empty(len(rooms), dtype=np.int64)
+            rank[order] = np.arange(len(rooms)) - group_start
+            keep &= rank < self.beam_width
+        return keep
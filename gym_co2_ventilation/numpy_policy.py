@@ -0,0 +1,152 @@
+"""Runs a trained DQN policy with NumPy only, without Keras or TensorFlow.
+
+Export the weights saved by DQNAgent.save_weights() once (needs h5py):
+
+    python -m gym_co2_ventilation.numpy_policy dqn_CO2VentilationSimulator-v0_weights.h5f policy.npz --lookup-table
+
+and load the exported policy wherever the controller runs:
+
+    policy = NumpyQPolicy.load('policy.npz')
+    action = policy.select_action(observation)
+"""
+import argparse
+import json
+import numpy as np
+
+ACTIVATIONS = {
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'linear': lambda x: x,
+}
+
+def _decode(names):
+    return [name.decode('utf8') if isinstance(name, bytes) else str(name) for name in names]
+
+def read_keras_weights(path):
+    """Returns the weights of every layer with weights in a Keras HDF5 weights file, in layer order."""
+    import h5py
+
+    with h5py.File(path, 'r') as f:
+        # Files written by model.save() keep the weights in a subgroup
+        group = f['model_weights'] if 'layer_names' not in f.attrs and 'model_weights' in f else f
+        layers = []
+        for layer_name in _decode(group.attrs['layer_names']):
+            layer_group = group[layer_name]
+            weights = [np.asarray(layer_group[weight_name]) for weight_name in _decode(layer_group.attrs['weight_names'])]
+            if weights:
+                layers.append(weights)
+    return layers
+
+class ActionLookupTable:
+    """Greedy action for every point of a grid over (fan speed, CO2 level, CO2 change).
+
+    Observations between grid points use the nearest one, and observations outside
+    the grid use the nearest edge.
+    """
+
+    def __init__(self, actions, low, step):
+        self.actions = actions
+        self.low = np.asarray(low, dtype=np.float32)
+        self.step = np.asarray(step, dtype=np.float32)
+        self._max_index = np.array(actions.shape) - 1
+
+    @classmethod
+    def build(cls, policy, low=(0, 400, -100), high=(3, 3000, 100), step=(1, 10, 5)):
+        low, high, step = (np.asarray(v, dtype=np.float32) for v in (low, high, step))
+        axes = [np.arange(l, h + s / 2, s, dtype=np.float32) for l, h, s in zip(low, high, step)]
+        grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(axes))
+        actions = policy.select_actions(grid).astype(np.int8).reshape([len(axis) for axis in axes])
+        return cls(actions, low, step)
+
+    def select_action(self, observation):
+        index = np.rint((np.asarray(observation, dtype=np.float32) - self.low) / self.step).astype(np.int64)
+        np.clip(index, 0, self._max_index, out=index)
+        return int(self.actions[tuple(index)])
+
+class NumpyQPolicy:
+    """Forward pass of a DQN model made of Dense layers, picking the action with the highest Q-value.
+
+    The hidden layers use hidden_activation and the output layer is linear, as in
+    the models built in the examples. With a lookup_table, select_action() looks the
+    action up instead of running the network.
+    """
+
+    def __init__(self, layers, hidden_activation='relu', lookup_table=None):
+        self.layers = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32)) for kernel, bias in layers]
+        self.hidden_activation = hidden_activation
+        self.lookup_table = lookup_table
+        self._activation = ACTIVATIONS[hidden_activation]
+
+    @classmethod
+    def from_keras_weights(cls, path, hidden_activation='relu'):
+        layers = read_keras_weights(path)
+        for weights in layers:
+            if len(weights) != 2:
+                raise ValueError(f"Only Dense layers with a bias are supported, found a layer with {len(weights)} weights in {path}")
+        return cls(layers, hidden_activation)
+
+    @classmethod
+    def from_weight_list(cls, weights, hidden_activation='relu'):
+        """From the list of kernels and biases returned by model.get_weights() of a Keras model of Dense layers."""
+        return cls(list(zip(weights[0::2], weights[1::2])), hidden_activation)
+
+    @property
+    def nb_actions(self):
+        return self.layers[-1][1].shape[0]
+
+    def q_values(self, observations):
+        """Q-values of a batch of observations, shape (batch, nb_actions)."""
+        x = np.asarray(observations, dtype=np.float32).reshape(len(observations), -1)
+        for i, (kernel, bias) in enumerate(self.layers):
+            x = x @ kernel
+            x += bias
+            if i < len(self.layers) - 1:
+                x = self._activation(x)
+        return x
+
+    def select_actions(self, observations):
+        return np.argmax(self.q_values(observations), axis=1)
+
+    def select_action(self, observation):
+        if self.lookup_table is not None:
+            return self.lookup_table.select_action(observation)
+        return int(self.select_actions(np.asarray(observation)[np.newaxis])[0])
+
+    def save(self, path):
+        arrays = {}
+        for i, (kernel, bias) in enumerate(self.layers):
+            arrays[f'kernel_{i}'] = kernel
+            arrays[f'bias_{i}'] = bias
+        if self.lookup_table is not None:
+            arrays['lookup_actions'] = self.lookup_table.actions
+            arrays['lookup_low'] = self.lookup_table.low
+            arrays['lookup_step'] = self.lookup_table.step
+        meta = {'nb_layers': len(self.layers), 'hidden_activation': self.hidden_activation}
+        np.savez(path, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            meta = json.loads(str(f['meta']))
+            layers = [(f[f'kernel_{i}'], f[f'bias_{i}']) for i in range(meta['nb_layers'])]
+            lookup_table = None
+            if 'lookup_actions' in f:
+                lookup_table = ActionLookupTable(f['lookup_actions'], f['lookup_low'], f['lookup_step'])
+        return cls(layers, meta['hidden_activation'], lookup_table)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export DQN weights saved by keras-rl to a NumPy policy (.npz)")
+    parser.add_argument('weights', help='Weights file written by DQNAgent.save_weights(), e.g. dqn_CO2VentilationSimulator-v0_weights.h5f')
+    parser.add_argument('output', help='Output .npz file')
+    parser.add_argument('--hidden-activation', default='relu', choices=sorted(ACTIVATIONS))
+    parser.add_argument('--lookup-table', action='store_true', help='Also precompute the action for every grid point')
+    parser.add_argument('--co2-step', type=float, default=10.0, help='Grid spacing of the CO2 level in the lookup table')
+    parser.add_argument('--co2-diff-step', type=float, default=5.0, help='Grid spacing of the CO2 change in the lookup table')
+    args = parser.parse_args(argv)
+
+    policy = NumpyQPolicy.from_keras_weights(args.weights, args.hidden_activation)
+    if args.lookup_table:
+        policy.lookup_table = ActionLookupTable.build(policy, step=(1, args.co2_step, args.co2_diff_step))
+    policy.save(args.output)
+
+if __name__ == '__main__':
+    main()
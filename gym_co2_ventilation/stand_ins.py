@@ -0,0 +1,223 @@
+import http.server
+import json
+import queue
+import random
+import re
+import threading
+import time
+import requests
+
+class StandInMessage:
+    def __init__(self, body, bus=None):
+        self.body = body
+        self._bus = bus
+
+    def delete(self):
+        if self._bus is not None:
+            self._bus.nb_deleted += 1
+
+class StandInServiceBus:
+    """In-process replacement for the parts of ServiceBusService used by the production environments.
+
+    Pass it as bus_service to CO2VentilationProductionEnv. Sensor messages in the
+    {"Id": ..., "Value": ...} format are published with publish(), or every
+    publish_interval seconds for each of sensor_ids by a background thread (a random
+    walk of CO2 levels unless a value_generator(sensor_id) is given). Only messages
+    matching the subscription rules (EventId='<sensor id>') are delivered, like the
+    real subscription. Faults can be injected:
+
+        receive_latency  seconds added to every receive call
+        timeout_rate     fraction of receive calls that raise requests.exceptions.ReadTimeout
+        drop_rate        fraction of published messages that are lost
+    """
+
+    def __init__(self, sensor_ids=("1401011",), publish_interval=None, value_generator=None,
+                 receive_latency=0.0, timeout_rate=0.0, drop_rate=0.0, seed=None):
+        self.sensor_ids = list(sensor_ids)
+        self.publish_interval = publish_interval
+        self.value_generator = value_generator
+        self.receive_latency = receive_latency
+        self.timeout_rate = timeout_rate
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+
+        self.rules = {}
+        self.messages = queue.Queue()
+        self._allowed_sensor_ids = None
+        self._co2_levels = {}
+
+        self.nb_published = 0
+        self.nb_dropped = 0
+        self.nb_filtered = 0
+        self.nb_delivered = 0
+        self.nb_deleted = 0
+        self.nb_timeouts = 0
+
+        self._running = False
+        self._thread = None
+        if publish_interval is not None:
+            self.start()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='StandInServiceBus', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def publish(self, sensor_id, value):
+        self.nb_published += 1
+        if self.drop_rate > 0.0 and self.random.random() < self.drop_rate:
+            self.nb_dropped += 1
+            return
+        if self._allowed_sensor_ids is not None and sensor_id not in self._allowed_sensor_ids:
+            self.nb_filtered += 1
+            return
+        self.messages.put(json.dumps({"Id": sensor_id, "Value": value}))
+
+    def list_rules(self, topic_name, subscription_name):
+        return list(self.rules.values())
+
+    def create_rule(self, topic_name, subscription_name, rule_name, rule):
+        rule.name = rule_name
+        self.rules[rule_name] = rule
+        self._update_filter()
+
+    def delete_rule(self, topic_name, subscription_name, rule_name):
+        del self.rules[rule_name]
+        self._update_filter()
+
+    def receive_subscription_message(self, topic_name, subscription_name, peek_lock=True, timeout=60):
+        if self.receive_latency > 0.0:
+            time.sleep(self.receive_latency)
+        if self.timeout_rate > 0.0 and self.random.random() < self.timeout_rate:
+            self.nb_timeouts += 1
+            raise requests.exceptions.ReadTimeout("Injected timeout from StandInServiceBus")
+        try:
+            body = self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return StandInMessage(None)
+        self.nb_delivered += 1
+        if not peek_lock:
+            # Receive-and-delete, the message is gone once it has been received
+            self.nb_deleted += 1
+            return StandInMessage(body)
+        return StandInMessage(body, self)
+
+    def _update_filter(self):
+        # No rules means no filtering, like the default rule of a subscription
+        allowed = set()
+        for rule in self.rules.values():
+            allowed.update(re.findall(r"EventId='([^']*)'", getattr(rule, 'filter_expression', None) or ''))
+        self._allowed_sensor_ids = allowed if self.rules else None
+
+    def _next_value(self, sensor_id):
+        if self.value_generator is not None:
+            return self.value_generator(sensor_id)
+        co2_level = self._co2_levels.get(sensor_id, 800) + self.random.randint(-20, 20)
+        co2_level = min(3000, max(400, co2_level))
+        self._co2_levels[sensor_id] = co2_level
+        return co2_level
+
+    def _run(self):
+        next_publish = time.monotonic()
+        while self._running:
+            for sensor_id in self.sensor_ids:
+                self.publish(sensor_id, self._next_value(sensor_id))
+            next_publish += self.publish_interval
+            time.sleep(max(0.0, next_publish - time.monotonic()))
+
+class _FanCommandHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        stand_in = self.server.stand_in
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with stand_in.lock:
+            stand_in.nb_requests += 1
+            fault = stand_in.random.random()
+
+        if stand_in.latency > 0.0:
+            time.sleep(stand_in.latency)
+        if fault < stand_in.drop_rate:
+            # Close the connection without answering
+            with stand_in.lock:
+                stand_in.nb_dropped += 1
+            self.close_connection = True
+            return
+        fault -= stand_in.drop_rate
+        if fault < stand_in.timeout_rate:
+            # Answer later than any sensible client read timeout
+            with stand_in.lock:
+                stand_in.nb_timeouts += 1
+            time.sleep(stand_in.hang_time)
+        else:
+            fault -= stand_in.timeout_rate
+            if fault < stand_in.error_rate:
+                with stand_in.lock:
+                    stand_in.nb_errors += 1
+                self._respond(500)
+                return
+
+        try:
+            command = json.loads(body)
+        except ValueError:
+            self._respond(400)
+            return
+        with stand_in.lock:
+            stand_in.commands.append((command.get('deviceId'), command.get('commandId')))
+        if stand_in.on_command is not None:
+            stand_in.on_command(command)
+        self._respond(200)
+
+    def _respond(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInFanServer:
+    """Fan speed REST endpoint on localhost, for VENTILATION_REST_URL.
+
+    Accepted commands are kept in commands as (deviceId, commandId), and on_command
+    is called with every accepted command. Faults can be injected:
+
+        latency      seconds added to every request
+        error_rate   fraction of requests answered with 500
+        timeout_rate fraction of requests answered after hang_time seconds
+        drop_rate    fraction of requests where the connection is closed without an answer
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, timeout_rate=0.0, drop_rate=0.0, hang_time=30.0,
+                 on_command=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.drop_rate = drop_rate
+        self.hang_time = hang_time
+        self.on_command = on_command
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.commands = []
+        self.nb_requests = 0
+        self.nb_errors = 0
+        self.nb_timeouts = 0
+        self.nb_dropped = 0
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _FanCommandHandler)
+        self.server.daemon_threads = True
+        self.server.stand_in = self
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/command'
+        self.thread = threading.Thread(target=self.server.serve_forever, name='StandInFanServer', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,134 @@
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+# Every recorded step is one fixed-width record, appended as raw bytes after a short file header
+STEP_RECORD_DTYPE = np.dtype([
+    ('iteration', '<i4'),
+    ('step', '<i4'),
+    ('fan_speed', '<i1'),
+    ('reward', '<f8'),
+    ('co2_level', '<f8'),
+    ('timestamp', '<f8'),
+])
+STEP_RECORD_MAGIC = b'CO2STEP1'
+
+# Same layout as the CSV written by the StepLogger in the examples
+CSV_HEADER = "Time,Iteration,Step,FanSpeed,Reward,CO2Level"
+
+class StepRecorder:
+    """Records steps into a preallocated ring buffer, flushed to an append-only binary file.
+
+    record() only copies a handful of numbers into the buffer. A background thread
+    writes the buffered records to disk every flush_interval seconds, or as soon as
+    the buffer is half full. Attach it to an environment with:
+
+        env.unwrapped.step_recorder = StepRecorder('co2_ventilation_steps.bin')
+
+    Use convert_to_csv() (or python -m gym_co2_ventilation.step_recorder) to turn the
+    binary file back into the StepLogger CSV layout.
+    """
+
+    def __init__(self, path, capacity=65536, flush_interval=1.0):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+
+        self._buffer = np.zeros(capacity, dtype=STEP_RECORD_DTYPE)
+        self._head = 0  # Number of records written to the buffer
+        self._tail = 0  # Number of records flushed to the file
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(STEP_RECORD_MAGIC)
+
+        self._thread = threading.Thread(target=self._run, name='StepRecorder', daemon=True)
+        self._thread.start()
+
+    def record(self, iteration, step, fan_speed, reward, co2_level, timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        with self._not_full:
+            # Only blocks if the flush thread has fallen a whole buffer behind
+            while self._head - self._tail >= self.capacity:
+                self._wakeup.set()
+                self._not_full.wait()
+            self._buffer[self._head % self.capacity] = (iteration, step, fan_speed, reward, co2_level, timestamp)
+            self._head += 1
+            if self._head - self._tail >= self.capacity // 2:
+                self._wakeup.set()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        with self._lock:
+            head = self._head
+            tail = self._tail
+        if head == tail:
+            return
+
+        # Records in [tail, head) are not overwritten until _tail is advanced, so they can be written without the lock
+        start = tail % self.capacity
+        count = head - tail
+        first_part = min(count, self.capacity - start)
+        self._file.write(self._buffer[start:start + first_part].tobytes())
+        if count > first_part:
+            self._file.write(self._buffer[:count - first_part].tobytes())
+        self._file.flush()
+
+        with self._not_full:
+            self._tail = head
+            self._not_full.notify_all()
+
+def read_step_records(path):
+    with open(path, 'rb') as f:
+        magic = f.read(len(STEP_RECORD_MAGIC))
+    if magic != STEP_RECORD_MAGIC:
+        raise ValueError(f"{path} is not a step record file")
+    # A partially written record at the end of the file (e.g. after a crash) is ignored
+    count = (os.path.getsize(path) - len(STEP_RECORD_MAGIC)) // STEP_RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=STEP_RECORD_DTYPE)
+    return np.memmap(path, dtype=STEP_RECORD_DTYPE, mode='r', offset=len(STEP_RECORD_MAGIC), shape=(count,))
+
+def convert_to_csv(path, csv_path):
+    records = read_step_records(path)
+    with open(csv_path, 'w') as f:
+        f.write(CSV_HEADER + "\n")
+        for record in records:
+            timestamp = float(record['timestamp'])
+            co2_level = float(record['co2_level'])
+            if co2_level.is_integer():
+                co2_level = int(co2_level)
+            time_text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+            f.write(f"{time_text}.{int(timestamp * 1000) % 1000:03d},{record['iteration']},{record['step']},{record['fan_speed']},{float(record['reward'])},{co2_level}\n")
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python -m gym_co2_ventilation.step_recorder <step_records.bin> <step_log.csv>")
+    convert_to_csv(sys.argv[1], sys.argv[2])
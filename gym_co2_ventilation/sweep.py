@@ -0,0 +1,293 @@
+"""Hyperparameter sweeps of the DQN agent over the simulator or replay environments.
+
+Trials run in parallel worker processes, each limited to threads_per_worker threads
+for BLAS and TensorFlow, and every finished trial is appended to a CSV results table
+right away. Running the same command again skips the trials already in the table,
+so an interrupted sweep continues where it left off:
+
+    python -m gym_co2_ventilation.sweep sweep_results.csv --search random --trials 32 --workers 8
+
+Trials train in rungs of rung_episodes episodes. After each rung, a trial whose mean
+episode reward is below the median of the other trials at the same rung is stopped.
+"""
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+
+DEFAULT_SEARCH_SPACE = {
+    'hidden_layers': [[16, 16, 16], [32, 32], [64, 64], [32, 32, 32]],
+    'policy': ['eps_greedy', 'boltzmann'],
+    'learning_rate': [1e-2, 1e-3, 1e-4],
+    'memory_limit': [6000, 24000, 96000],
+    'reward_config': [
+        None,
+        {'ventilation_costs': [0.0, 0.1, 0.2, 0.4]},
+        {'ventilation_costs': [0.0, 0.4, 0.8, 1.6]},
+        {'fan_change_penalty': 0.3},
+    ],
+}
+
+# Thread pool sizes read by the BLAS libraries and TensorFlow when they are loaded
+THREAD_LIMIT_VARIABLES = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                          'VECLIB_MAXIMUM_THREADS', 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS']
+
+RESULT_COLUMNS = ['trial_id', 'status', 'score', 'episodes', 'duration', 'rung_rewards', 'config', 'error']
+
+class LogUniform:
+    """Random search samples a value between low and high, uniformly on a log scale."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def sample(self, random):
+        return float(np.exp(random.uniform(np.log(self.low), np.log(self.high))))
+
+def grid_search(space):
+    """All combinations of the values in space (parameter name => list of values)."""
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def random_search(space, nb_trials, seed=None):
+    """nb_trials configurations with a random value (or LogUniform sample) of every parameter."""
+    random = np.random.RandomState(seed)
+    configs = []
+    for _ in range(nb_trials):
+        config = {}
+        for name in sorted(space):
+            values = space[name]
+            config[name] = values.sample(random) if isinstance(values, LogUniform) else values[random.randint(len(values))]
+        configs.append(config)
+    return configs
+
+def get_trial_id(config):
+    """Stable ID of a configuration, used to find the trials already in the results table."""
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+
+class MedianStopper:
+    """Stops a trial whose reward at a rung is below the median of the other trials at that rung.
+
+    The rewards are shared with the worker processes through a multiprocessing
+    manager. Nothing is stopped before grace_rungs rungs, or while fewer than
+    min_trials other trials have reached the rung.
+    """
+
+    def __init__(self, manager, grace_rungs=1, min_trials=4):
+        self.grace_rungs = grace_rungs
+        self.min_trials = min_trials
+        self._rewards = manager.dict()  # rung => list of rewards
+        self._lock = manager.Lock()
+
+    def record(self, rung, reward):
+        with self._lock:
+            self._rewards[rung] = self._rewards.get(rung, []) + [reward]
+
+    def should_stop(self, rung, reward):
+        others = self._rewards.get(rung, [])
+        self.record(rung, reward)
+        if rung < self.grace_rungs or len(others) < self.min_trials:
+            return False
+        return reward < np.median(others)
+
+def train_dqn(config, report):
+    """Trains and evaluates a keras-rl DQNAgent with one configuration, returns the evaluation score.
+
+    report(episodes, mean_reward) is called after every rung, and training stops when it returns True.
+    """
+    import gym
+    import gym_co2_ventilation  # This will register the custom environments
+    from gym_co2_ventilation.envs.reward_engine import RewardEngine
+    from keras.models import Sequential
+    from keras.layers import Dense, Activation, Flatten
+    from keras.optimizers import Adam
+    from rl.agents.dqn import DQNAgent
+    from rl.memory import SequentialMemory
+    from rl.policy import BoltzmannQPolicy, EpsGreedyQPolicy
+    _limit_tensorflow_threads(config['threads'])
+
+    env = gym.make(config['env'])
+    env.seed(config['seed'])
+    np.random.seed(config['seed'])
+    if config.get('reward_config') is not None:
+        env.unwrapped.reward_engine = RewardEngine(**config['reward_config'])
+    nb_actions = env.action_space.n
+
+    model = Sequential()
+    model.add(Flatten(input_shape=(1,) + env.observation_space.shape))
+    for units in config['hidden_layers']:
+        model.add(Dense(units))
+        model.add(Activation('relu'))
+    model.add(Dense(nb_actions))
+    model.add(Activation('linear'))
+
+    policy = BoltzmannQPolicy() if config['policy'] == 'boltzmann' else EpsGreedyQPolicy()
+    memory = SequentialMemory(limit=config['memory_limit'], window_length=1)
+    dqn = DQNAgent(model=model, nb_actions=nb_actions, memory=memory, nb_steps_warmup=10,
+                   target_model_update=1e-2, policy=policy)
+    dqn.compile(Adam(lr=config['learning_rate']), metrics=['mae'])
+
+    nb_episode_steps = config['episode_steps']
+    episodes = 0
+    while episodes < config['episodes']:
+        nb_episodes = min(config['rung_episodes'], config['episodes'] - episodes)
+        history = dqn.fit(env, nb_max_episode_steps=nb_episode_steps, nb_steps=nb_episode_steps * nb_episodes, verbose=0)
+        episodes += nb_episodes
+        if report(episodes, float(np.mean(history.history['episode_reward']))):
+            return None
+
+    history = dqn.test(env, nb_episodes=config['eval_episodes'], nb_max_episode_steps=nb_episode_steps, visualize=False, verbose=0)
+    return float(np.mean(history.history['episode_reward']))
+
+def _limit_tensorflow_threads(threads):
+    import tensorflow as tf
+    if hasattr(tf, 'ConfigProto'):
+        # TensorFlow 1.x, as used by keras-rl, does not read TF_NUM_INTRAOP_THREADS
+        from keras import backend as K
+        K.set_session(tf.Session(config=tf.ConfigProto(intra_op_parallelism_threads=threads, inter_op_parallelism_threads=1)))
+
+def _run_trial(trial_fn, trial_id, config, stopper):
+    # Runs in a worker process
+    start = time.monotonic()
+    rung_rewards = []
+    progress = {'episodes': 0}
+
+    def report(episodes, mean_reward):
+        progress['episodes'] = episodes
+        rung_rewards.append(mean_reward)
+        return stopper is not None and stopper.should_stop(len(rung_rewards) - 1, mean_reward)
+
+    result = {'trial_id': trial_id, 'rung_rewards': rung_rewards, 'config': config, 'error': ''}
+    try:
+        score = trial_fn(config, report)
+        if score is None:
+            result.update(status='stopped', score=rung_rewards[-1])
+        else:
+            result.update(status='completed', score=score)
+    except Exception as e:
+        result.update(status='failed', score=float('nan'), error=repr(e))
+    result.update(episodes=progress['episodes'], duration=time.monotonic() - start)
+    return result
+
+def read_results(path):
+    """Rows of a results table, with the score, rung rewards and configuration parsed."""
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        row['score'] = float(row['score'])
+        row['episodes'] = int(row['episodes'])
+        row['duration'] = float(row['duration'])
+        row['rung_rewards'] = json.loads(row['rung_rewards'])
+        row['config'] = json.loads(row['config'])
+    return rows
+
+def _append_result(path, result):
+    is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        if is_new:
+            writer.writeheader()
+        row = dict(result, rung_rewards=json.dumps(result['rung_rewards']), config=json.dumps(result['config'], sort_keys=True))
+        writer.writerow({column: row[column] for column in RESULT_COLUMNS})
+
+def run_sweep(configs, results_path, trial_fn=train_dqn, nb_workers=None, threads_per_worker=1, early_stopping=True,
+              grace_rungs=1, min_trials=4, log=print):
+    """Runs the configurations not yet in the results table on a pool of worker processes.
+
+    trial_fn(config, report) must be a module-level function, so it can be sent to
+    the workers. Failed trials are recorded with their error and run again on resume.
+    Returns all the rows of the results table.
+    """
+    if nb_workers is None:
+        nb_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    done = {row['trial_id'] for row in read_results(results_path) if row['status'] != 'failed'}
+    pending = [(get_trial_id(config), config) for config in configs]
+    pending = [(trial_id, config) for trial_id, config in pending if trial_id not in done]
+    log(f"{len(configs) - len(pending)} of {len(configs)} trials already done, running {len(pending)} on {nb_workers} workers")
+    if not pending:
+        return read_results(results_path)
+
+    # The workers inherit the limits when they are started, before they load NumPy or TensorFlow
+    saved_environ = {name: os.environ.get(name) for name in THREAD_LIMIT_VARIABLES}
+    os.environ.update({name: str(threads_per_worker) for name in THREAD_LIMIT_VARIABLES})
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Manager() as manager:
+            stopper = MedianStopper(manager, grace_rungs, min_trials) if early_stopping else None
+            # Rewards of the trials already done count towards the medians
+            if stopper is not None:
+                for row in read_results(results_path):
+                    for rung, reward in enumerate(row['rung_rewards']):
+                        stopper.record(rung, reward)
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=nb_workers, mp_context=context) as executor:
+                futures = [executor.submit(_run_trial, trial_fn, trial_id, dict(config, threads=threads_per_worker), stopper)
+                           for trial_id, config in pending]
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        result = future.result()
+                        # Only the parent writes the table, once per finished trial
+                        result['config'].pop('threads')
+                        _append_result(results_path, result)
+                        log(f"Trial {result['trial_id']} {result['status']} after {result['episodes']} episodes, score={result['score']:.3f}")
+                except KeyboardInterrupt:
+                    for future in futures:
+                        future.cancel()
+                    raise
+    finally:
+        for name, value in saved_environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return read_results(results_path)
+
+def format_results(rows, nb_rows=20):
+    """The best trials as a text table."""
+    rows = sorted((row for row in rows if row['status'] != 'failed'), key=lambda row: -row['score'])[:nb_rows]
+    lines = [f"{'trial_id':<12}  {'status':<9}  {'score':>8}  {'episodes':>8}  config"]
+    for row in rows:
+        lines.append(f"{row['trial_id']:<12}  {row['status']:<9}  {row['score']:>8.3f}  {row['episodes']:>8}  {json.dumps(row['config'], sort_keys=True)}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results', help='CSV results table, created or resumed')
+    parser.add_argument('--space', help='JSON file with the search space (parameter name => list of values), default DEFAULT_SEARCH_SPACE')
+    parser.add_argument('--search', choices=['grid', 'random'], default='random')
+    parser.add_argument('--trials', type=int, default=32, help='Number of random search trials')
+    parser.add_argument('--seed', type=int, default=123, help='Seed of the random search and of every trial')
+    parser.add_argument('--env', default='CO2VentilationSimulator-v0',
+                        help='CO2VentilationSimulator-v0, or CO2VentilationReplay-v0 with CO2_VENTILATION_TRACE_PATH set')
+    parser.add_argument('--episodes', type=int, default=400, help='Training episodes per trial')
+    parser.add_argument('--rung-episodes', type=int, default=50, help='Episodes between early stopping decisions')
+    parser.add_argument('--episode-steps', type=int, default=60)
+    parser.add_argument('--eval-episodes', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count / threads per worker)')
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--no-early-stopping', action='store_true')
+    args = parser.parse_args(argv)
+
+    space = DEFAULT_SEARCH_SPACE
+    if args.space is not None:
+        with open(args.space) as f:
+            space = json.load(f)
+    configs = grid_search(space) if args.search == 'grid' else random_search(space, args.trials, args.seed)
+    settings = {'env': args.env, 'episodes': args.episodes, 'rung_episodes': args.rung_episodes,
+                'episode_steps': args.episode_steps, 'eval_episodes': args.eval_episodes, 'seed': args.seed}
+    configs = [dict(config, **settings) for config in configs]
+
+    rows = run_sweep(configs, args.results, nb_workers=args.workers, threads_per_worker=args.threads_per_worker,
+                     early_stopping=not args.no_early_stopping)
+    print(format_results(rows))
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ from setuptools import setup
 
 setup(name='gym_co2_ventilation',
       version='0.0.1',
+      python_requires='>=3.8',
       install_requires=[
             'gym',
             'keras',
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from gym_co2_ventilation.envs.co2_ventilation_simulator_env import CO2VentilationSimulatorEnv, SIMULATOR_STATE_DTYPE
+from gym_co2_ventilation.envs.co2_ventilation_vector_simulator_env import VectorCO2VentilationSimulatorEnv
+from gym_co2_ventilation.envs.scenario_library import generate_scenarios, write_scenario_library
+
+ACTIONS = [3, 1, 0, 2, 2, 0, 3, 3, 1, 0]
+
+def _rollout(env, actions):
+    return [env.step(action) for action in actions]
+
+def _assert_same_rollouts(rollout, expected):
+    for (observation, reward, done, info), (expected_observation, expected_reward, expected_done, expected_info) in zip(rollout, expected):
+        np.testing.assert_array_equal(observation, expected_observation)
+        assert reward == expected_reward
+        assert done == expected_done
+
+@pytest.fixture
+def scenario_path(tmp_path):
+    write_scenario_library(str(tmp_path), **generate_scenarios(nb_scenarios=3, nb_steps=120, seed=0))
+    return str(tmp_path)
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'rolling_feature_config': {'window': 600.0, 'slope_halflife': 300.0}},
+])
+def test_restore_state_replays_the_same_steps(kwargs):
+    env = CO2VentilationSimulatorEnv(**kwargs)
+    env.seed(0)
+    env.reset()
+    _rollout(env, [0] * 5 + [3] * 5)
+
+    snapshot = env.clone_state()
+    expected = _rollout(env, ACTIONS)
+    env.restore_state(snapshot)
+    _assert_same_rollouts(_rollout(env, ACTIONS), expected)
+
+def test_restore_state_replays_scenarios_and_random_numbers(scenario_path):
+    env = CO2VentilationSimulatorEnv(scenario_path=scenario_path, rolling_feature_config={})
+    env.seed(1)
+    env.reset()
+    _rollout(env, ACTIONS)
+
+    snapshots = np.zeros(2, dtype=SIMULATOR_STATE_DTYPE)
+    env.clone_state(out=snapshots[1])
+    expected = _rollout(env, ACTIONS)
+    expected_reset = env.reset()
+    expected_random = env.np_random.uniform()
+
+    env.restore_state(snapshots[1])
+    _assert_same_rollouts(_rollout(env, ACTIONS), expected)
+    np.testing.assert_array_equal(env.reset(), expected_reset)
+    assert env.np_random.uniform() == expected_random
+
+def test_vector_restore_state_replays_the_same_steps():
+    vector_env = VectorCO2VentilationSimulatorEnv(num_envs=3, max_episode_steps=8)
+    vector_env.reset()
+    vector_env.step(np.array([3, 0, 1]))
+
+    snapshots = vector_env.clone_state()
+    expected = [vector_env.step(np.array([action, 3 - action, 0])) for action in ACTIONS]
+    vector_env.restore_state(snapshots)
+    np.testing.assert_array_equal(vector_env.clone_state(), snapshots)
+    for action, (expected_observations, expected_rewards, expected_dones, expected_info) in zip(ACTIONS, expected):
+        observations, rewards, dones, info = vector_env.step(np.array([action, 3 - action, 0]))
+        np.testing.assert_array_equal(observations, expected_observations)
+        np.testing.assert_array_equal(rewards, expected_rewards)
+        np.testing.assert_array_equal(dones, expected_dones)
+
+def test_vector_env_branches_from_a_simulator_snapshot():
+    env = CO2VentilationSimulatorEnv()
+    env.reset()
+    _rollout(env, [0] * 5)
+    snapshot = env.clone_state()
+
+    vector_env = VectorCO2VentilationSimulatorEnv(num_envs=4)
+    vector_env.restore_state(snapshot)
+    observations, rewards, dones, info = vector_env.step(np.arange(4))
+    for action in range(4):
+        env.restore_state(snapshot)
+        observation, reward, done, info = env.step(action)
+        np.testing.assert_allclose(observations[action], observation, rtol=1e-6)
+        assert rewards[action] == pytest.approx(reward)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from gym_co2_ventilation.envs.reward_engine import RewardEngine
+
+CO2_LEVELS = [400, 899.9, 900, 949, 950, 1000, 1199, 1200, 1499, 1500, 3000]
+
+def _scalar_rewards(engine, co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change, outdoor_temperatures=None):
+    if outdoor_temperatures is None:
+        outdoor_temperatures = [None] * len(co2_levels)
+    return np.array([engine.get_reward(float(co2_level), int(speed), int(previous_speed), bool(penalize), outdoor_temperature)
+                     for co2_level, speed, previous_speed, penalize, outdoor_temperature
+                     in zip(co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change, outdoor_temperatures)])
+
+@pytest.mark.parametrize('reward_config', [
+    {},
+    {'co2_thresholds': [800, 1000], 'co2_rewards': [1.0, 0.0, -1.0], 'fan_change_penalty': 0.3},
+])
+def test_batched_rewards_match_scalar_rewards(reward_config):
+    engine = RewardEngine(**reward_config)
+    random = np.random.RandomState(0)
+    co2_levels = np.concatenate((CO2_LEVELS, random.uniform(400, 3000, size=200)))
+    ventilation_speeds = random.randint(4, size=len(co2_levels))
+    previous_ventilation_speeds = random.randint(4, size=len(co2_levels))
+    penalize_change = random.uniform(size=len(co2_levels)) < 0.5
+
+    expected = _scalar_rewards(engine, co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change)
+    rewards = engine.get_rewards(co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change)
+    np.testing.assert_allclose(rewards, expected)
+
+def test_batched_rewards_match_scalar_rewards_with_outdoor_temperature():
+    engine = RewardEngine()
+    random = np.random.RandomState(1)
+    co2_levels = random.uniform(400, 3000, size=100)
+    ventilation_speeds = random.randint(4, size=100)
+    previous_ventilation_speeds = random.randint(4, size=100)
+    penalize_change = np.ones(100, dtype=bool)
+    outdoor_temperatures = random.uniform(-20, 35, size=100)
+
+    expected = _scalar_rewards(engine, co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change, outdoor_temperatures)
+    rewards = engine.get_rewards(co2_levels, ventilation_speeds, previous_ventilation_speeds, penalize_change, outdoor_temperatures)
+    np.testing.assert_allclose(rewards, expected)
+
+def test_thresholds_are_inclusive_lower_bounds():
+    engine = RewardEngine()
+    assert engine.get_reward(899, 0, 0) == 1.0
+    assert engine.get_reward(900, 0, 0) == 0.9
+    assert engine.get_reward(1500, 0, 0) == -0.6
+
+def test_episode_rewards_do_not_penalize_first_step():
+    engine = RewardEngine()
+    co2_levels = np.full((2, 3), 800.0)
+    ventilation_speeds = np.array([[1, 1, 2], [3, 0, 0]])
+    expected = [[-0.2, -0.2, -0.5], [-0.8, -0.1, 0.0]]
+    np.testing.assert_allclose(engine.get_episode_rewards(co2_levels, ventilation_speeds) - 1.0, expected)
+
+def test_invalid_tables_are_rejected():
+    with pytest.raises(ValueError):
+        RewardEngine(co2_thresholds=[900, 1000], co2_rewards=[1.0, 0.0])
+    with pytest.raises(ValueError):
+        RewardEngine(co2_thresholds=[1000, 900], co2_rewards=[1.0, 0.0, -1.0])
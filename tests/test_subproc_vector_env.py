@@ -0,0 +1,52 @@
+import gym
+import numpy as np
+import pytest
+import gym_co2_ventilation  # This will register the custom environments
+from gym_co2_ventilation.envs.co2_ventilation_vector_simulator_env import VectorCO2VentilationSimulatorEnv
+from gym_co2_ventilation.envs.subproc_vector_env import SubprocVectorEnv
+
+@pytest.fixture
+def make_subproc_env():
+    envs = []
+    def make(*args, **kwargs):
+        env = SubprocVectorEnv(*args, **kwargs)
+        envs.append(env)
+        return env
+    yield make
+    for env in envs:
+        env.close()
+
+def test_scalar_envs_match_and_reset_after_time_limit(make_subproc_env):
+    env = make_subproc_env('CO2VentilationSimulator-v0', 3, num_workers=2)
+    reference = gym.make('CO2VentilationSimulator-v0')
+    observations = env.reset()
+    observation = reference.reset()
+    assert observations.shape == (3, 3)
+
+    for i in range(61):
+        action = i % 4
+        observations, rewards, dones, infos = env.step(np.full(3, action))
+        observation, reward, done, _ = reference.step(action)
+        np.testing.assert_allclose(rewards, reward)
+        np.testing.assert_array_equal(dones, done)
+        if done:
+            for info in infos:
+                np.testing.assert_allclose(info['terminal_observation'], observation, rtol=1e-6)
+            observation = reference.reset()
+        np.testing.assert_allclose(observations, np.tile(observation, (3, 1)), rtol=1e-6)
+
+def test_vectorized_envs_have_a_reward_and_done_per_room(make_subproc_env):
+    env = make_subproc_env('CO2VentilationVectorSimulator-v0', 2)
+    reference = VectorCO2VentilationSimulatorEnv(num_envs=1)
+    assert env.batch_shape == (1,)
+    np.testing.assert_allclose(env.reset(), [reference.reset()] * 2)
+
+    actions = np.random.RandomState(0).randint(4, size=(70, 1))
+    for action in actions:
+        observations, rewards, dones, infos = env.step(np.array([action, action]))
+        observation, reward, done, info = reference.step(action)
+        assert observations.shape == (2, 1, 3) and rewards.shape == dones.shape == (2, 1)
+        # The rooms reset themselves after max_episode_steps, the worker must not reset them again
+        np.testing.assert_allclose(observations, [observation] * 2, rtol=1e-6)
+        np.testing.assert_allclose(rewards, [reward] * 2)
+        np.testing.assert_array_equal(dones, [done] * 2)
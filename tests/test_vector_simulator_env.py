@@ -0,0 +1,42 @@
+import numpy as np
+from gym_co2_ventilation.envs.co2_ventilation_simulator_env import CO2VentilationSimulatorEnv
+from gym_co2_ventilation.envs.co2_ventilation_vector_simulator_env import VectorCO2VentilationSimulatorEnv
+
+def test_single_room_matches_scalar_simulator():
+    max_episode_steps = 20
+    env = CO2VentilationSimulatorEnv()
+    vector_env = VectorCO2VentilationSimulatorEnv(num_envs=1, max_episode_steps=max_episode_steps)
+    np.testing.assert_allclose(vector_env.reset()[0], env.reset())
+
+    actions = np.random.RandomState(0).randint(4, size=3 * max_episode_steps)
+    for i, action in enumerate(actions):
+        observation, reward, done, info = env.step(int(action))
+        observations, rewards, dones, vector_info = vector_env.step(np.array([action]))
+        assert rewards[0] == reward
+        if (i + 1) % max_episode_steps == 0:
+            # The vector environment resets the room by itself
+            assert dones[0]
+            np.testing.assert_allclose(vector_info['terminal_observation'][0], observation, rtol=1e-6)
+            assert vector_info['episode_reward'][0] == env.total_reward
+            observation = env.reset()
+        else:
+            assert not dones[0]
+        np.testing.assert_allclose(observations[0], observation, rtol=1e-6)
+
+def test_rooms_are_independent():
+    vector_env = VectorCO2VentilationSimulatorEnv(num_envs=4)
+    vector_env.reset()
+    single_env = VectorCO2VentilationSimulatorEnv(num_envs=1)
+    single_env.reset()
+    for actions in [[0, 1, 2, 3], [3, 3, 0, 0], [3, 2, 1, 0]]:
+        observations, rewards, dones, info = vector_env.step(np.array(actions))
+        single_observations, single_rewards, single_dones, single_info = single_env.step(np.array(actions[2:3]))
+        np.testing.assert_array_equal(observations[2], single_observations[0])
+        assert rewards[2] == single_rewards[0]
+
+def test_observations_stay_within_observation_space():
+    vector_env = VectorCO2VentilationSimulatorEnv(num_envs=4, co2_model_config={'occupancy': 60.0})
+    observations = vector_env.reset()
+    for actions in [[0, 0, 0, 0]] * 30 + [[3, 3, 3, 3]] * 30:
+        assert vector_env.observation_space.contains(observations)
+        observations = vector_env.step(np.array(actions))[0]